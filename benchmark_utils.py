@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import PIL
+from PIL import Image, ImageDraw, ImageFilter
+
+from gallery_utils import (
+    DEFAULT_QUALITY,
+    DEFAULT_TARGET_SIZE,
+    PROJECT_CONFIG_FILENAME,
+    BuildCache,
+    EncoderProfile,
+    compress_batch,
+    decode_thumbnail,
+    finish_gallery,
+    fit_width,
+    gallery_jobs,
+    list_images,
+    make_placeholder,
+    make_slideshow_blur,
+    resolve_decode_mode,
+    resolve_encoder_profile,
+    resolve_worker_count,
+    responsive_variants,
+)
+from page_utils import write_project_page
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，无法统计峰值 RSS
+    resource = None
+
+BENCHMARK_VERSION = 1
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+SYNTHETIC_QUALITY = 92
+# 吞吐量都由耗时推算而来，对比基线时只看耗时、输出字节与峰值内存
+COMPARED_METRICS = ("seconds", "output_bytes")
+# 太短的阶段受计时抖动影响过大，不参与退化判断
+MIN_COMPARABLE_SECONDS = 0.05
+
+
+@dataclass
+class Corpus:
+    name: str
+    gallery: Path
+    images: int
+    input_bytes: int
+
+
+def generate_synthetic_corpus(
+    folder: Path,
+    count: int,
+    size: Tuple[int, int],
+    seed: int = 0,
+) -> Corpus:
+    """Write ``count`` photo-like JPEGs (gradient sky, blurred shapes, sensor noise) into ``folder``."""
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    width, height = size
+    for index in range(count):
+        top = tuple(rng.randrange(256) for _ in range(3))
+        bottom = tuple(rng.randrange(256) for _ in range(3))
+        mask = Image.linear_gradient("L").resize(size)
+        img = Image.composite(Image.new("RGB", size, bottom), Image.new("RGB", size, top), mask)
+        draw = ImageDraw.Draw(img)
+        for _ in range(24):
+            x, y = rng.randrange(width), rng.randrange(height)
+            radius = rng.randrange(max(width, height) // 40, max(width, height) // 6)
+            fill = tuple(rng.randrange(256) for _ in range(3))
+            if rng.random() < 0.5:
+                draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=fill)
+            else:
+                draw.rectangle((x - radius, y - radius // 2, x + radius, y + radius // 2), fill=fill)
+        img = img.filter(ImageFilter.GaussianBlur(max(width, height) / 800))
+        noise = Image.effect_noise(size, 24).convert("RGB")
+        img = Image.blend(img, noise, 0.12)
+        img.save(folder / f"synthetic-{index:04d}.jpg", "JPEG", quality=SYNTHETIC_QUALITY)
+    return _describe_corpus(f"synthetic-{count}x{width}x{height}", folder)
+
+
+def copy_project_corpus(project_dir: Path, folder: Path) -> Corpus:
+    """Copy a real project's gallery and gallery.json so benchmark builds never touch the project itself.
+
+    ``folder`` is the copy's ``public/gallery``; the config lands two levels up
+    so the build picks the same profile, colour mode and quality target as the project.
+    """
+    source = project_dir / "public" / "gallery"
+    names = list_images(source)
+    if not names:
+        raise FileNotFoundError(f"{source} 中没有图片。")
+    folder.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        shutil.copy2(source / name, folder / name)
+    config = project_dir / PROJECT_CONFIG_FILENAME
+    if config.exists():
+        shutil.copy2(config, folder.parent.parent / PROJECT_CONFIG_FILENAME)
+    return _describe_corpus(project_dir.name, folder)
+
+
+def run_benchmark(corpus: Corpus, workers: int | None = None) -> Dict[str, object]:
+    """Benchmark the full gallery build (cold and warm) and each stage on its own."""
+    project_dir = corpus.gallery.parent.parent
+    profile = resolve_encoder_profile(project_dir)
+    decode_mode = resolve_decode_mode()
+    worker_count = resolve_worker_count(workers)
+    report: Dict[str, object] = {
+        "version": BENCHMARK_VERSION,
+        "corpus": {"name": corpus.name, "images": corpus.images, "input_bytes": corpus.input_bytes},
+        "environment": {
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": sys.platform,
+            "cpu_count": os.cpu_count(),
+            "workers": worker_count,
+            "profile": profile.name,
+            "decode": decode_mode,
+            "gallery_env": {key: value for key, value in os.environ.items() if key.startswith("GALLERY_")},
+        },
+        "stages": run_stage_benchmarks(corpus, profile, decode_mode),
+    }
+
+    worker_peaks: List[int] = []
+
+    def build() -> None:
+        # 与 新增图库/更新图库 走同一条路径：同样的任务（含分析阶段与色彩、校验等设置）、
+        # 雪碧图、按需的缩放瓦片、manifest 与项目页
+        (project_dir / "public" / "background").mkdir(parents=True, exist_ok=True)
+        cache = BuildCache.load(project_dir)
+        results = compress_batch(gallery_jobs(project_dir), workers=worker_count, cache=cache, desc="Benchmark build")
+        worker_peaks.extend(result.meta.get("memory_report", {}).get("peak_rss") or 0 for result in results)
+        write_project_page(project_dir, finish_gallery(project_dir, cache, workers=worker_count))
+
+    report["end_to_end"] = {
+        "cold": _measure(build, corpus),
+        "warm": _measure(build, corpus),
+    }
+    report["end_to_end"]["cold"]["output_bytes"] = _folder_bytes(project_dir / "public") - corpus.input_bytes
+    if resource is not None:
+        # worker 由 forkserver 派生，不是本进程的子进程，RUSAGE_CHILDREN 统计不到；
+        # 改用每张图片结果里 worker 自报的峰值
+        report["peak_rss"] = {
+            "main": _peak_rss(resource.RUSAGE_SELF),
+            "workers": max(worker_peaks, default=0),
+        }
+    return report
+
+
+def run_stage_benchmarks(corpus: Corpus, profile: EncoderProfile, decode_mode: str) -> Dict[str, Dict[str, float]]:
+    """Time each pipeline stage over the whole corpus in a single process."""
+    names = list_images(corpus.gallery)
+    variants = responsive_variants(profile=profile)
+    payloads: List[bytes] = []
+    frames: List[Image.Image] = []
+    metadata: List[Dict[str, bytes]] = []
+    output_bytes = {"encode": 0, "variants": 0}
+
+    def read() -> None:
+        payloads.extend((corpus.gallery / name).read_bytes() for name in names)
+
+    def decode() -> None:
+        for data in payloads:
+            with Image.open(io.BytesIO(data)) as img:
+                metadata.append(profile.metadata_for(img))
+                frames.append(decode_thumbnail(img, DEFAULT_TARGET_SIZE, fast=decode_mode != "exact"))
+
+    def encode(fmt: str, frame: Image.Image, quality: int, kept: Dict[str, bytes]) -> int:
+        buffer = io.BytesIO()
+        frame.save(buffer, fmt, quality=quality, **profile.save_options(fmt, kept))
+        return buffer.tell()
+
+    def encode_background() -> None:
+        for frame, kept in zip(frames, metadata):
+            output_bytes["encode"] += encode("JPEG", frame, DEFAULT_QUALITY, kept)
+
+    def encode_variants() -> None:
+        for frame, kept in zip(frames, metadata):
+            for variant in variants:
+                resized = fit_width(frame, variant.width, DEFAULT_TARGET_SIZE)
+                output_bytes["variants"] += encode(variant.format, resized, variant.quality, kept)
+
+    def extras() -> None:
+        for frame in frames:
+            make_placeholder(frame)
+            make_slideshow_blur(frame)
+
+    stages = {}
+    for name, stage in (
+        ("read", read),
+        ("decode", decode),
+        ("encode", encode_background),
+        ("variants", encode_variants),
+        ("placeholder_blur", extras),
+    ):
+        stages[name] = _measure(stage, corpus)
+        if name in output_bytes:
+            stages[name]["output_bytes"] = output_bytes[name]
+    return stages
+
+
+def compare_with_baseline(
+    report: Dict[str, object],
+    baseline: Dict[str, object],
+    threshold: float = DEFAULT_REGRESSION_THRESHOLD,
+) -> List[str]:
+    """Describe every metric that regressed by more than ``threshold`` relative to ``baseline``."""
+    regressions = []
+    current = _flatten_metrics(report)
+    for key, old in _flatten_metrics(baseline).items():
+        new = current.get(key)
+        metric = key.rsplit(".", 1)[-1]
+        if new is None or not old:
+            continue
+        if not key.startswith("peak_rss.") and metric not in COMPARED_METRICS:
+            continue
+        if metric == "seconds" and old < MIN_COMPARABLE_SECONDS:
+            continue
+        change = (new - old) / old
+        if change > threshold:
+            regressions.append(f"{key}: {old:.4g} → {new:.4g}（{change * 100:+.1f}%）")
+    return regressions
+
+
+def save_report(report: Dict[str, object], path: Path) -> None:
+    path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def load_report(path: Path) -> Dict[str, object]:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def make_workspace() -> Path:
+    return Path(tempfile.mkdtemp(prefix="mainquest-bench-"))
+
+
+def _measure(stage: Callable[[], None], corpus: Corpus) -> Dict[str, float]:
+    start = time.perf_counter()
+    stage()
+    seconds = time.perf_counter() - start
+    return {
+        "seconds": round(seconds, 4),
+        "images_per_sec": round(corpus.images / seconds, 3) if seconds else 0.0,
+        "mb_per_sec": round(corpus.input_bytes / 1024 / 1024 / seconds, 3) if seconds else 0.0,
+    }
+
+
+def _flatten_metrics(report: Dict[str, object]) -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    for section in ("stages", "end_to_end", "peak_rss"):
+        values = report.get(section, {})
+        for name, metrics in values.items():
+            if isinstance(metrics, dict):
+                for metric, value in metrics.items():
+                    if isinstance(value, (int, float)):
+                        flat[f"{section}.{name}.{metric}"] = float(value)
+            elif isinstance(metrics, (int, float)):
+                flat[f"{section}.{name}"] = float(metrics)
+    return flat
+
+
+def _describe_corpus(name: str, folder: Path) -> Corpus:
+    names = list_images(folder)
+    return Corpus(
+        name=name,
+        gallery=folder,
+        images=len(names),
+        input_bytes=sum((folder / image).stat().st_size for image in names),
+    )
+
+
+def _folder_bytes(folder: Path) -> int:
+    return sum(path.stat().st_size for path in folder.rglob("*") if path.is_file())
+
+
+def _peak_rss(who: int) -> int:
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak if sys.platform == "darwin" else peak * 1024
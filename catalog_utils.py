@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from PIL import ExifTags, Image, UnidentifiedImageError
+
+from gallery_utils import BACKGROUND_EXTENSIONS, CONTACT_DIRNAME, COVER_DIRNAME, RESPONSIVE_DIRNAME, ZOOM_DIRNAME
+
+CATALOG_FILENAME = ".mainquest-catalog.sqlite3"
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    path TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    captured_at TEXT,
+    camera_make TEXT,
+    camera_model TEXT,
+    lens TEXT,
+    focal_length REAL,
+    focal_length_35mm INTEGER,
+    aperture REAL,
+    exposure_time REAL,
+    iso INTEGER,
+    orientation INTEGER,
+    gps_latitude REAL,
+    gps_longitude REAL,
+    gps_altitude REAL
+);
+CREATE INDEX IF NOT EXISTS idx_photos_captured ON photos (captured_at);
+CREATE INDEX IF NOT EXISTS idx_photos_camera ON photos (camera_model, captured_at);
+CREATE INDEX IF NOT EXISTS idx_photos_lens ON photos (lens);
+CREATE INDEX IF NOT EXISTS idx_photos_collection ON photos (collection, captured_at);
+"""
+
+COLUMNS = (
+    "path", "source", "collection", "kind", "size", "mtime_ns", "width", "height",
+    "captured_at", "camera_make", "camera_model", "lens", "focal_length",
+    "focal_length_35mm", "aperture", "exposure_time", "iso", "orientation",
+    "gps_latitude", "gps_longitude", "gps_altitude",
+)
+
+
+@dataclass
+class CatalogStats:
+    scanned: int = 0
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    failed: int = 0
+
+
+def open_catalog(root: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(root / CATALOG_FILENAME)
+    conn.row_factory = sqlite3.Row
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version != SCHEMA_VERSION:
+        conn.executescript("DROP TABLE IF EXISTS photos;")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def iter_catalog_sources(root: Path) -> Iterator[Tuple[Path, str, str, str]]:
+    """Yield ``(path, source, collection, kind)`` for project photos and journal assets."""
+    for public_dir in sorted((root / "project").glob("*/public")):
+        collection = public_dir.parent.name
+        for folder in sorted(public_dir.iterdir()):
+            # 响应式变体、雪碧图、封面缩略图和缩放瓦片都是生成出来的衍生图，不进目录
+            if not folder.is_dir() or folder.name in (RESPONSIVE_DIRNAME, CONTACT_DIRNAME, COVER_DIRNAME, ZOOM_DIRNAME):
+                continue
+            for path in _iter_images(folder):
+                yield path, "project", collection, folder.name
+    for assets_dir in sorted((root / "journals").glob("*/assets")):
+        for path in _iter_images(assets_dir):
+            yield path, "journal", assets_dir.parent.name, "assets"
+
+
+def update_catalog(conn: sqlite3.Connection, root: Path) -> CatalogStats:
+    """Bring the catalog in line with the files on disk; unchanged files are not reopened."""
+    stats = CatalogStats()
+    known: Dict[str, Tuple[int, int]] = {
+        row["path"]: (row["size"], row["mtime_ns"])
+        for row in conn.execute("SELECT path, size, mtime_ns FROM photos")
+    }
+    seen = set()
+    rows: List[Tuple] = []
+    for path, source, collection, kind in iter_catalog_sources(root):
+        stats.scanned += 1
+        key = path.relative_to(root).as_posix()
+        seen.add(key)
+        stat = path.stat()
+        if known.get(key) == (stat.st_size, stat.st_mtime_ns):
+            stats.unchanged += 1
+            continue
+        try:
+            metadata = read_photo_metadata(path)
+        except (OSError, UnidentifiedImageError) as exc:
+            print(f"⚠️ 无法读取 {key}：{exc}")
+            stats.failed += 1
+            continue
+        record = {
+            "path": key,
+            "source": source,
+            "collection": collection,
+            "kind": kind,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            **metadata,
+        }
+        rows.append(tuple(record.get(column) for column in COLUMNS))
+        if key in known:
+            stats.updated += 1
+        else:
+            stats.added += 1
+
+    removed = [(key,) for key in known if key not in seen]
+    stats.removed = len(removed)
+    placeholders = ", ".join("?" for _ in COLUMNS)
+    with conn:
+        conn.executemany(f"INSERT OR REPLACE INTO photos ({', '.join(COLUMNS)}) VALUES ({placeholders})", rows)
+        conn.executemany("DELETE FROM photos WHERE path = ?", removed)
+    return stats
+
+
+def read_photo_metadata(path: Path) -> Dict[str, object]:
+    """Size and EXIF fields from the file header; pixel data is never decoded."""
+    with Image.open(path) as img:
+        width, height = img.size
+        exif = img.getexif()
+    base = exif
+    detail = exif.get_ifd(ExifTags.IFD.Exif)
+    gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    tags = ExifTags.Base
+    return {
+        "width": width,
+        "height": height,
+        "captured_at": _parse_exif_datetime(
+            detail.get(tags.DateTimeOriginal) or detail.get(tags.DateTimeDigitized) or base.get(tags.DateTime)
+        ),
+        "camera_make": _clean_text(base.get(tags.Make)),
+        "camera_model": _clean_text(base.get(tags.Model)),
+        "lens": _clean_text(detail.get(tags.LensModel)),
+        "focal_length": _to_float(detail.get(tags.FocalLength)),
+        "focal_length_35mm": _to_int(detail.get(tags.FocalLengthIn35mmFilm)),
+        "aperture": _to_float(detail.get(tags.FNumber)),
+        "exposure_time": _to_float(detail.get(tags.ExposureTime)),
+        "iso": _to_int(detail.get(tags.ISOSpeedRatings)),
+        "orientation": _to_int(base.get(tags.Orientation)),
+        "gps_latitude": _gps_coordinate(gps.get(ExifTags.GPS.GPSLatitude), gps.get(ExifTags.GPS.GPSLatitudeRef)),
+        "gps_longitude": _gps_coordinate(gps.get(ExifTags.GPS.GPSLongitude), gps.get(ExifTags.GPS.GPSLongitudeRef)),
+        "gps_altitude": _to_float(gps.get(ExifTags.GPS.GPSAltitude)),
+    }
+
+
+def find_photos(
+    conn: sqlite3.Connection,
+    *,
+    camera: str | None = None,
+    lens: str | None = None,
+    date: str | None = None,
+    collection: str | None = None,
+) -> List[sqlite3.Row]:
+    """Filter by camera/lens substring, capture date (``YYYY-MM-DD``) and collection, in capture order."""
+    clauses: List[str] = []
+    params: List[object] = []
+    if camera:
+        clauses.append("camera_model LIKE ?")
+        params.append(f"%{camera}%")
+    if lens:
+        clauses.append("lens LIKE ?")
+        params.append(f"%{lens}%")
+    if date:
+        clauses.append("captured_at >= ? AND captured_at < ?")
+        params.extend([date, f"{date}T99"])
+    if collection:
+        clauses.append("collection = ?")
+        params.append(collection)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return conn.execute(
+        f"SELECT * FROM photos {where} ORDER BY captured_at, path", params
+    ).fetchall()
+
+
+def collections_by_lens(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+    return conn.execute(
+        "SELECT lens, collection, COUNT(*) AS photos FROM photos "
+        "WHERE lens IS NOT NULL GROUP BY lens, collection ORDER BY lens, photos DESC"
+    ).fetchall()
+
+
+def camera_summary(conn: sqlite3.Connection) -> List[sqlite3.Row]:
+    return conn.execute(
+        "SELECT COALESCE(camera_model, '未知相机') AS camera, COUNT(*) AS photos, "
+        "MIN(captured_at) AS first_shot, MAX(captured_at) AS last_shot "
+        "FROM photos GROUP BY camera ORDER BY photos DESC"
+    ).fetchall()
+
+
+def _iter_images(folder: Path) -> Iterator[Path]:
+    for path in sorted(folder.iterdir()):
+        if path.is_file() and path.name.lower().endswith(BACKGROUND_EXTENSIONS):
+            yield path
+
+
+def _parse_exif_datetime(value: object) -> str | None:
+    text = _clean_text(value)
+    if not text:
+        return None
+    try:
+        return datetime.strptime(text[:19], "%Y:%m:%d %H:%M:%S").isoformat()
+    except ValueError:
+        return None
+
+
+def _clean_text(value: object) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", errors="ignore")
+    text = str(value).replace("\x00", "").strip()
+    return text or None
+
+
+def _to_float(value: object) -> float | None:
+    try:
+        number = float(value)  # IFDRational 也支持 float()
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return number if number == number else None  # 排除 0/0 得到的 NaN
+
+
+def _to_int(value: object) -> int | None:
+    if isinstance(value, tuple):
+        value = value[0] if value else None
+    number = _to_float(value)
+    return int(number) if number is not None else None
+
+
+def _gps_coordinate(value: object, ref: object) -> float | None:
+    if not isinstance(value, tuple) or len(value) != 3:
+        return None
+    degrees, minutes, seconds = (_to_float(part) for part in value)
+    if degrees is None or minutes is None or seconds is None:
+        return None
+    coordinate = degrees + minutes / 60 + seconds / 3600
+    if _clean_text(ref) in ("S", "W"):
+        coordinate = -coordinate
+    return round(coordinate, 7)
@@ -0,0 +1,2375 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import IO, Callable, Dict, Iterable, List, Tuple
+from urllib.parse import quote
+
+try:
+    from PIL import ImageCms
+except ImportError:  # Pillow 未编译 littlecms 时没有色彩管理
+    ImageCms = None
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，无法统计峰值 RSS
+    resource = None
+
+from PIL import Image, ImageChops, ImageFilter, ImageOps, ImageStat, UnidentifiedImageError, features
+from tqdm import tqdm
+
+IMAGE_EXTENSIONS = ("png", "jpg", "jpeg")
+# public/background 里还可能有重新压缩存档转成 WebP/AVIF 的图（没有原图的那些）
+BACKGROUND_EXTENSIONS = IMAGE_EXTENSIONS + ("webp", "avif")
+DEFAULT_TARGET_SIZE = (1800, 1200)
+DEFAULT_QUALITY = 70
+WORKERS_ENV = "GALLERY_WORKERS"
+IO_THREADS = 2
+# 每个阶段之间的队列长度 = worker 数 × 该值，决定同时驻留内存的图片数量上限
+QUEUE_DEPTH_PER_WORKER = 2
+DECODE_ENV = "GALLERY_DECODE"
+DECODE_MODES = ("fast", "exact", "compare")
+# libjpeg 的 DCT 缩放解码本身就是均值缩小，只需保证不小于最终尺寸；
+# reduce() 是粗糙的盒式缩小，至少保留最终尺寸的 2 倍再交给 LANCZOS
+DRAFT_GAP = 1.0
+REDUCING_GAP = 2.0
+MEMORY_ENV = "GALLERY_MEMORY_MB"
+BYTES_PER_PIXEL = 4  # Pillow 的 RGB/RGBA 图像每像素占 4 字节
+PROFILE_ENV = "GALLERY_PROFILE"
+PROFILE_COMPARE_ENV = "GALLERY_PROFILE_COMPARE"
+PROJECT_CONFIG_FILENAME = "gallery.json"
+DEFAULT_PROFILE = "web"
+EXIF_ORIENTATION = 0x0112
+COLOR_ENV = "GALLERY_COLOR"
+COLOR_MODES = ("keep", "srgb", "strip")
+COLOR_TRANSFORM_LIMIT = 16
+QUALITY_ENV = "GALLERY_QUALITY"
+VERIFY_ENV = "GALLERY_VERIFY"
+# MS-SSIM 低于此值的衍生图在汇总里单独列出
+SSIM_WARNING = 0.95
+QUALITY_SEARCH_RANGE = (40, 92)
+CACHE_FILENAME = ".mainquest-cache.json"
+JOURNAL_FILENAME = ".mainquest-build.journal"
+# 本项目的历史记录少于此数时，构建计划改用所有项目的吞吐量
+PLAN_MIN_SAMPLES = 3
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 2
+CACHE_VERSION = 2
+HASH_CHUNK_SIZE = 1 << 20
+RESPONSIVE_DIRNAME = "responsive"
+RESPONSIVE_WIDTHS = (480, 960, 1800)
+# 现代格式按优先级排列，<picture> 中靠前的 <source> 会被浏览器优先选用
+MODERN_FORMATS = (("AVIF", 50), ("WEBP", 70))
+FORMAT_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "AVIF": "avif"}
+FORMAT_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "AVIF": "image/avif"}
+GALLERY_SIZES = "(max-width: 1000px) 50vw, 500px"
+SLIDESHOW_SIZES = "100vw"
+CARD_SIZES = "(max-width: 768px) 100vw, (max-width: 1024px) 50vw, 400px"
+# 低清占位图：长边 16px 的 JPEG 内联为 data URI，页面先绘制它再由懒加载换成原图
+SLIDESHOW_BLUR_WIDTH = 96
+SLIDESHOW_BLUR_RADIUS = 4  # 约等于 1800px 图上 CSS blur(50px) 的效果缩放到 96px
+SLIDESHOW_BLUR_QUALITY = 60
+CONTACT_DIRNAME = "contact"
+CONTACT_FILENAME = "contact.json"
+CONTACT_VERSION = 1
+CONTACT_CELL = (180, 120)  # 与首页卡片 .update-image 的 3:2 比例一致
+CONTACT_COLUMNS = 8
+CONTACT_CELLS_PER_SHEET = 64
+CONTACT_FORMATS = (("JPEG", 70), ("WEBP", 70))
+COVER_DIRNAME = "cover"
+COVER_SIZE = (400, 267)  # 首页/图库卡片 .update-image 为 3:2，桌面端约 400px 宽
+COVER_SCALES = (1, 2)
+ZOOM_ENV = "GALLERY_ZOOM"
+ZOOM_DIRNAME = "zoom"
+ZOOM_FILENAME = "zoom.json"
+ZOOM_VERSION = 1
+# 与 OpenSeadragon 的 DZI 默认值一致：256px 瓦片，相邻瓦片重叠 1px 以免缩放时出现接缝
+ZOOM_TILE_SIZE = 256
+ZOOM_OVERLAP = 1
+ZOOM_QUALITY = 80
+# EXIF 方向值对应的转置操作（与 ImageOps.exif_transpose 相同）
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 50
+# 只用于本次运行的统计信息，不写入构建缓存
+TRANSIENT_META = (
+    "decode_report", "quality_report", "memory_report", "encode_report", "color_report", "stage_report",
+)
+_PIPELINE_DONE = object()
+# 每个 worker 进程各自缓存按源 ICC 配置文件构建的色彩转换（转换对象无法跨进程传递）
+_COLOR_TRANSFORMS: Dict[str, Tuple[str, object]] = {}
+_SRGB_PROFILE: Dict[str, object] = {}
+
+
+@dataclass(frozen=True)
+class Variant:
+    width: int
+    format: str
+    quality: int
+
+    def filename(self, stem: str) -> str:
+        return f"{stem}-{self.width}.{FORMAT_EXTENSIONS[self.format]}"
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    """Named encoder settings applied to every JPEG a build writes.
+
+    ``metadata`` is ``"none"`` (ICC only) or ``"all"`` (ICC, full EXIF and
+    XMP). Pixels are always written upright, so the EXIF orientation tag is
+    never kept;
+    ``formats`` lists the modern formats emitted next to the JPEG variants.
+    """
+
+    name: str
+    progressive: bool
+    optimize: bool
+    subsampling: str
+    metadata: str
+    formats: Tuple[str, ...]
+
+    def settings(self) -> List[object]:
+        return [self.name, self.progressive, self.optimize, self.subsampling, self.metadata, list(self.formats)]
+
+    def metadata_for(self, img: Image.Image) -> Dict[str, bytes]:
+        """Metadata from the source header that this profile keeps, as Pillow ``save()`` keywords."""
+        kept: Dict[str, bytes] = {}
+        if img.info.get("icc_profile"):
+            kept["icc_profile"] = img.info["icc_profile"]
+        if self.metadata == "none":
+            return kept
+        exif = img.getexif()
+        # 像素已按方向标签转正，再带上标签浏览器会转第二次
+        exif.pop(EXIF_ORIENTATION, None)
+        if exif:
+            kept["exif"] = exif.tobytes()
+        if img.info.get("xmp"):
+            kept["xmp"] = img.info["xmp"]
+        return kept
+
+    def save_options(self, fmt: str, metadata: Dict[str, bytes]) -> Dict[str, object]:
+        options: Dict[str, object] = dict(metadata)
+        if fmt == "JPEG":
+            options.update(progressive=self.progressive, optimize=self.optimize, subsampling=self.subsampling)
+        return options
+
+
+ENCODER_PROFILES: Dict[str, EncoderProfile] = {
+    # 面向访客：渐进式 + 优化霍夫曼表，4:2:0，只保留 ICC（像素已按 EXIF 方向转正）
+    "web": EncoderProfile("web", True, True, "4:2:0", "none", ("AVIF", "WEBP")),
+    # 存档：不做色度抽样，保留全部 EXIF/XMP，只输出 JPEG
+    "archive": EncoderProfile("archive", False, True, "4:4:4", "all", ()),
+    # 本地预览：编码最快的 baseline JPEG，去掉全部元数据
+    "preview": EncoderProfile("preview", False, False, "4:2:0", "none", ("WEBP",)),
+}
+
+
+@dataclass(frozen=True)
+class QualityTarget:
+    """Per-image JPEG quality goal: a byte budget, a PSNR and/or MS-SSIM floor.
+
+    With a floor, the lowest quality that still reaches it is chosen; a
+    budget then caps that at the highest quality whose encode fits.
+    """
+
+    max_bytes: int | None = None
+    min_psnr: float | None = None
+    min_ssim: float | None = None
+    min_quality: int = QUALITY_SEARCH_RANGE[0]
+    max_quality: int = QUALITY_SEARCH_RANGE[1]
+
+    def key(self) -> str:
+        parts = []
+        if self.max_bytes is not None:
+            parts.append(f"budget={self.max_bytes}")
+        if self.min_psnr is not None:
+            parts.append(f"psnr={self.min_psnr:g}")
+        if self.min_ssim is not None:
+            parts.append(f"ssim={self.min_ssim:g}")
+        parts.append(f"range={self.min_quality}-{self.max_quality}")
+        return "auto:" + ",".join(parts)
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One consumer of the decoded frame in the compression pipeline.
+
+    ``run`` receives the :class:`StageContext` of an image and either writes
+    derivatives through :meth:`StageContext.emit` or returns a small dict,
+    which the build cache keeps per image under ``stages[name]`` together
+    with ``version``. Bumping the version re-runs only that stage on the
+    next build. ``run`` must be a module-level function so the job can be
+    sent to worker processes. Stages that write files set ``writes_files``;
+    they become part of the build settings, so changing them rebuilds
+    every output.
+    """
+
+    name: str
+    run: Callable[[StageContext], Dict[str, object] | None]
+    version: int = 1
+    writes_files: bool = False
+
+
+@dataclass
+class StageContext:
+    """The single decoded frame of one image, shared by every stage of its job."""
+
+    job: CompressJob
+    frame: Image.Image  # RGB，已缩放到 target_size 内（并按 color_mode 转换过颜色）
+    metadata: Dict[str, bytes]  # 每次编码都带上的 ICC/EXIF
+    source_size: Tuple[int, int]
+    meta: Dict[str, object] = field(default_factory=dict)
+    files: List[Tuple[str, bytes]] = field(default_factory=list)
+    outputs: List[Dict[str, object]] = field(default_factory=list)
+    jpeg_quality: int | None = None
+    encode_seconds: float = 0.0
+    _array: object = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        if self.jpeg_quality is None:
+            self.jpeg_quality = self.job.quality
+
+    def array(self):
+        """The frame as a read-only ``uint8`` NumPy array (height × width × 3), created once."""
+        if self._array is None:
+            import numpy as np  # 只有用到数组的阶段需要 numpy
+
+            self._array = np.asarray(self.frame)
+        return self._array
+
+    def emit(self, path: Path, frame: Image.Image, fmt: str, quality: int, role: str | None = None) -> bytes:
+        """Encode ``frame`` with the job's profile and queue it for writing to ``path``."""
+        job = self.job
+        start = time.perf_counter()
+        buffer = io.BytesIO()
+        frame.save(buffer, fmt, quality=quality, **job.profile.save_options(fmt, self.metadata))
+        self.encode_seconds += time.perf_counter() - start
+        payload = buffer.getvalue()
+        self.files.append((str(path), payload))
+        self.outputs.append(_output_info(path, fmt, frame.size, role))
+        if job.verify and role is None:
+            # 参考图就是编码前缩放到同一尺寸的帧；模糊图本就是有意失真，不参与评分
+            self.outputs[-1]["ssim"] = round(derivative_ssim(frame, payload), 5)
+        return payload
+
+
+@dataclass
+class CompressJob:
+    source: Path
+    destination: Path
+    target_size: Tuple[int, int] = DEFAULT_TARGET_SIZE
+    quality: int = DEFAULT_QUALITY
+    variants: Tuple[Variant, ...] = ()
+    variant_dir: Path | None = None
+    decode_mode: str = "fast"
+    quality_target: QualityTarget | None = None
+    # 之前为同一内容（按 sha256）搜索出的质量，命中时跳过搜索
+    searched_quality: int | None = None
+    slideshow_blur: bool = False
+    profile: EncoderProfile = ENCODER_PROFILES[DEFAULT_PROFILE]
+    compare_profiles: bool = False
+    color_mode: str = "keep"
+    verify: bool = False
+    # 在内置阶段之后运行的额外阶段，共用同一次解码
+    stages: Tuple[Stage, ...] = ()
+    # 非空时只补跑这些阶段（输出文件已是最新）
+    refresh_stages: Tuple[str, ...] = ()
+
+    def settings(self) -> Dict[str, object]:
+        settings: Dict[str, object] = {
+            "format": "JPEG",
+            "target_size": list(self.target_size),
+            "quality": self.quality_target.key() if self.quality_target else self.quality,
+            "variants": [[v.width, v.format, v.quality] for v in self.variants],
+            # compare 模式输出的就是 fast 路径的结果
+            "decode": "exact" if self.decode_mode == "exact" else "fast",
+            "profile": self.profile.settings(),
+            # 之前的输出保留方向标签而不旋转像素，尺寸与占位图都是横着的，需要重建
+            "orientation": "applied",
+        }
+        if self.color_mode != "keep":
+            settings["color"] = self.color_mode
+        if self.verify:
+            settings["verify"] = "ms-ssim"
+        written = [[stage.name, stage.version] for stage in self.stages if stage.writes_files]
+        if written:
+            settings["stages"] = written
+        if self.slideshow_blur:
+            settings["slideshow_blur"] = [SLIDESHOW_BLUR_WIDTH, SLIDESHOW_BLUR_RADIUS, SLIDESHOW_BLUR_QUALITY]
+        return settings
+
+    def variant_path(self, variant: Variant) -> Path:
+        folder = self.variant_dir or self.destination.parent
+        return folder / variant.filename(self.destination.stem)
+
+    def blur_path(self) -> Path:
+        folder = self.variant_dir or self.destination.parent
+        return folder / f"{self.destination.stem}-blur.jpg"
+
+
+@dataclass
+class CompressResult:
+    job: CompressJob
+    error: str | None = None
+    fingerprint: Dict[str, object] | None = None
+    outputs: List[Dict[str, object]] = field(default_factory=list)
+    meta: Dict[str, object] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BuildPlan:
+    """What a build would do, worked out from file headers and the build cache alone."""
+
+    encode: List[Tuple[CompressJob, Tuple[int, int], int]] = field(default_factory=list)  # (任务, 源尺寸, 源字节数)
+    skip: List[CompressJob] = field(default_factory=list)
+    delete: List[Tuple[Path, int]] = field(default_factory=list)  # (衍生图, 释放的字节数)
+    throughput: Dict[str, object] | None = None
+
+    @property
+    def megapixels(self) -> float:
+        return sum(width * height for _, (width, height), _ in self.encode) / 1_000_000
+
+
+def list_images(folder: str | os.PathLike, extensions: Tuple[str, ...] = IMAGE_EXTENSIONS) -> List[str]:
+    return sorted(
+        name for name in os.listdir(folder) if name.lower().endswith(extensions)
+    )
+
+
+def resolve_worker_count(workers: int | None = None) -> int:
+    """Explicit argument first, then $GALLERY_WORKERS, then every CPU core."""
+    if workers is None:
+        raw = os.environ.get(WORKERS_ENV, "").strip()
+        if raw:
+            try:
+                workers = int(raw)
+            except ValueError:
+                print(f"⚠️ {WORKERS_ENV}={raw} 不是有效的整数，改用 CPU 核心数。")
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, workers)
+
+
+def resolve_decode_mode(mode: str | None = None) -> str:
+    """Explicit argument first, then $GALLERY_DECODE, defaulting to the fast path."""
+    if mode is None:
+        mode = os.environ.get(DECODE_ENV, "").strip().lower() or "fast"
+    if mode not in DECODE_MODES:
+        print(f"⚠️ {DECODE_ENV}={mode} 无效（可选 {'/'.join(DECODE_MODES)}），改用 fast。")
+        mode = "fast"
+    return mode
+
+
+def resolve_memory_budget(megabytes: int | None = None) -> int | None:
+    """Explicit argument first, then $GALLERY_MEMORY_MB; ``None`` leaves memory unbounded."""
+    if megabytes is None:
+        raw = os.environ.get(MEMORY_ENV, "").strip()
+        if not raw:
+            return None
+        try:
+            megabytes = int(raw)
+        except ValueError:
+            print(f"⚠️ {MEMORY_ENV}={raw} 不是有效的整数，不限制内存。")
+            return None
+    if megabytes <= 0:
+        return None
+    return megabytes * 1024 * 1024
+
+
+def resolve_quality_target(spec: str | None = None) -> QualityTarget | None:
+    """Parse ``budget:<KB>``, ``psnr:<dB>``, ``ssim:<MS-SSIM>`` (comma separated) from the argument or $GALLERY_QUALITY.
+
+    Returns ``None`` (fixed quality) when nothing is configured.
+    """
+    if spec is None:
+        spec = os.environ.get(QUALITY_ENV, "")
+    spec = spec.strip().lower()
+    if not spec:
+        return None
+    max_bytes = None
+    min_psnr = None
+    min_ssim = None
+    try:
+        for part in spec.split(","):
+            name, _, value = part.strip().partition(":")
+            if name == "budget":
+                max_bytes = int(float(value) * 1024)
+            elif name == "psnr":
+                min_psnr = float(value)
+            elif name == "ssim":
+                min_ssim = float(value)
+                if not 0 < min_ssim < 1:
+                    raise ValueError(part)
+            else:
+                raise ValueError(part)
+    except ValueError:
+        print(f"⚠️ {QUALITY_ENV}={spec} 无效（例如 budget:300,psnr:38 或 ssim:0.99），改用固定质量 {DEFAULT_QUALITY}。")
+        return None
+    return QualityTarget(max_bytes=max_bytes, min_psnr=min_psnr, min_ssim=min_ssim)
+
+
+def resolve_verify(enabled: bool | None = None) -> bool:
+    """Score every derivative's MS-SSIM against its downscaled reference when $GALLERY_VERIFY is set."""
+    if enabled is None:
+        enabled = os.environ.get(VERIFY_ENV, "").strip().lower() not in ("", "0", "false", "no")
+    return enabled
+
+
+def resolve_zoom(project_dir: str | os.PathLike | None = None, enabled: bool | None = None) -> bool:
+    """Explicit argument first, then $GALLERY_ZOOM, then ``"zoom"`` in gallery.json; off by default.
+
+    Tile pyramids of every original add several MB per photo to the deployed
+    site, so they are built only for projects that ask for them.
+    """
+    if enabled is None:
+        raw = os.environ.get(ZOOM_ENV, "").strip().lower()
+        if raw:
+            enabled = raw not in ("0", "false", "no")
+    if enabled is None and project_dir is not None:
+        enabled = bool(load_project_config(project_dir).get("zoom"))
+    return bool(enabled)
+
+
+def load_project_config(project_dir: str | os.PathLike) -> Dict[str, object]:
+    """Per-project overrides from ``gallery.json``; an absent or broken file means defaults."""
+    path = Path(project_dir) / PROJECT_CONFIG_FILENAME
+    if not path.exists():
+        return {}
+    try:
+        config = json.loads(path.read_text(encoding="utf-8"))
+    except (json.JSONDecodeError, OSError) as exc:
+        print(f"⚠️ 无法读取 {path}：{exc}")
+        return {}
+    return config if isinstance(config, dict) else {}
+
+
+def resolve_encoder_profile(project_dir: str | os.PathLike | None = None, name: str | None = None) -> EncoderProfile:
+    """Explicit argument first, then $GALLERY_PROFILE, then ``"profile"`` in the project's gallery.json."""
+    if name is None:
+        name = os.environ.get(PROFILE_ENV, "").strip().lower() or None
+    if name is None and project_dir is not None:
+        name = load_project_config(project_dir).get("profile")
+    name = name or DEFAULT_PROFILE
+    if name not in ENCODER_PROFILES:
+        print(f"⚠️ 编码档位 {name} 无效（可选 {'/'.join(ENCODER_PROFILES)}），改用 {DEFAULT_PROFILE}。")
+        name = DEFAULT_PROFILE
+    return ENCODER_PROFILES[name]
+
+
+def resolve_color_mode(project_dir: str | os.PathLike | None = None, mode: str | None = None) -> str:
+    """Explicit argument first, then $GALLERY_COLOR, then ``"color"`` in gallery.json; defaults to ``keep``.
+
+    ``keep`` copies the source ICC profile as before, ``srgb`` converts to
+    sRGB and embeds a compact sRGB profile, ``strip`` converts and embeds none.
+    """
+    if mode is None:
+        mode = os.environ.get(COLOR_ENV, "").strip().lower() or None
+    if mode is None and project_dir is not None:
+        mode = load_project_config(project_dir).get("color")
+    mode = mode or "keep"
+    if mode not in COLOR_MODES:
+        print(f"⚠️ 色彩模式 {mode} 无效（可选 {'/'.join(COLOR_MODES)}），改用 keep。")
+        return "keep"
+    if mode != "keep" and ImageCms is None:
+        print("⚠️ 当前 Pillow 不支持 ImageCms（littlecms），无法转换到 sRGB，改用 keep。")
+        return "keep"
+    return mode
+
+
+def resolve_profile_compare() -> bool:
+    return os.environ.get(PROFILE_COMPARE_ENV, "").strip().lower() in ("1", "true", "yes")
+
+
+def available_formats(formats: Iterable[str] | None = None) -> Tuple[Tuple[str, int], ...]:
+    """Modern formats the local Pillow can encode (optionally limited to ``formats``), followed by the JPEG fallback."""
+    wanted = None if formats is None else set(formats)
+    modern = tuple(
+        (fmt, quality)
+        for fmt, quality in MODERN_FORMATS
+        if (wanted is None or fmt in wanted) and features.check(fmt.lower())
+    )
+    return modern + (("JPEG", DEFAULT_QUALITY),)
+
+
+def responsive_variants(
+    target_size: Tuple[int, int] = DEFAULT_TARGET_SIZE,
+    widths: Iterable[int] = RESPONSIVE_WIDTHS,
+    profile: EncoderProfile | None = None,
+) -> Tuple[Variant, ...]:
+    """Every width × format except the full-width JPEG, which is the background file itself."""
+    variants: List[Variant] = []
+    for width in widths:
+        for fmt, quality in available_formats(profile.formats if profile else None):
+            if fmt == "JPEG" and width >= target_size[0]:
+                continue
+            variants.append(Variant(width=min(width, target_size[0]), format=fmt, quality=quality))
+    return tuple(variants)
+
+
+def gallery_jobs(
+    project_dir: str | os.PathLike,
+    names: Iterable[str] | None = None,
+    target_size: Tuple[int, int] = DEFAULT_TARGET_SIZE,
+) -> List[CompressJob]:
+    """Compression jobs for the originals in ``public/gallery`` (all, or just ``names``) with the project's settings.
+
+    Profile, colour mode, decode mode, quality target and verification come
+    from gallery.json and the ``GALLERY_*`` variables, exactly as 新增图库,
+    更新图库 and the benchmark build them.
+    """
+    from image_analysis import ANALYSIS_STAGES  # image_analysis 依赖 numpy，并反过来导入本模块
+
+    project_dir = Path(project_dir)
+    gallery_dir = project_dir / "public" / "gallery"
+    background_dir = project_dir / "public" / "background"
+    # 编码档位（web/archive/preview）决定渐进式、霍夫曼优化、色度抽样、元数据与输出格式
+    profile = resolve_encoder_profile(project_dir)
+    # 除 background 中的 JPEG 外，同时生成多种宽度的 AVIF/WebP/JPEG 供 srcset 使用
+    variants = responsive_variants(target_size, profile=profile)
+    color_mode = resolve_color_mode(project_dir)
+    decode_mode = resolve_decode_mode()
+    quality_target = resolve_quality_target()
+    verify = resolve_verify()
+    compare = resolve_profile_compare()
+    return [
+        CompressJob(
+            source=gallery_dir / name,
+            destination=background_dir / name,
+            target_size=target_size,
+            variants=variants,
+            variant_dir=project_dir / "public" / RESPONSIVE_DIRNAME,
+            decode_mode=decode_mode,
+            quality_target=quality_target,
+            slideshow_blur=True,
+            profile=profile,
+            compare_profiles=compare,
+            color_mode=color_mode,
+            verify=verify,
+            stages=ANALYSIS_STAGES,
+        )
+        for name in sorted(list_images(gallery_dir) if names is None else names)
+    ]
+
+
+def finish_gallery(
+    project_dir: str | os.PathLike,
+    cache: BuildCache | None = None,
+    *,
+    workers: int | None = None,
+) -> ProjectManifest:
+    """Every build step after compression: contact sheets, zoom tiles when enabled, then the saved manifest."""
+    build_contact_sheets(project_dir, workers=workers)
+    if resolve_zoom(project_dir):
+        build_zoom_pyramids(project_dir, workers=workers)
+    # 记录每张图的衍生图尺寸与页面数据（占位图、srcset、模糊图、缩放瓦片），项目页只由它渲染
+    manifest = ProjectManifest.build(project_dir, cache)
+    manifest.save()
+    return manifest
+
+
+def compress_image(
+    input_path: str | os.PathLike,
+    output_path: str | os.PathLike,
+    target_size: Tuple[int, int] = DEFAULT_TARGET_SIZE,
+    quality: int = DEFAULT_QUALITY,
+) -> None:
+    job = CompressJob(Path(input_path), Path(output_path), target_size, quality)
+    files, _, _ = _encode_job(job, job.source.read_bytes())
+    _write_files(files)
+
+
+def compress_batch(
+    jobs: Iterable[CompressJob],
+    *,
+    workers: int | None = None,
+    io_threads: int = IO_THREADS,
+    desc: str = "Compressing images",
+    cache: BuildCache | None = None,
+    memory_mb: int | None = None,
+) -> List[CompressResult]:
+    """Compress jobs through a read → encode → write pipeline; results keep submission order.
+
+    Reader threads load source bytes, a process pool decodes and encodes them
+    entirely in memory, and writer threads flush the encoded files, so disk
+    I/O overlaps with CPU work. Every hand-off is a bounded queue, which caps
+    the number of images held in memory regardless of project size.
+
+    A failing image is reported and skipped instead of aborting the batch.
+    With a cache, jobs whose source and settings are unchanged are skipped and
+    each successful result is checkpointed to the build journal as soon as
+    its files are written, so an interrupted batch resumes where it stopped.
+
+    With a memory budget (``memory_mb`` or $GALLERY_MEMORY_MB), each source's
+    decode cost is estimated from its header before dispatch and workers only
+    start an image while the estimates in flight fit the budget; oversized
+    JPEGs are decoded at reduced scale instead of full resolution. Other
+    formats cannot be, so oversized ones are budgeted (and reported) at
+    their full decode size.
+    """
+    jobs = list(jobs)
+    results: List[CompressResult] = []
+    if cache is not None:
+        pending, refresh = [], []
+        for job in jobs:
+            if not cache.is_fresh(job):
+                pending.append(job)
+                continue
+            missing = cache.missing_stages(job)
+            if missing:
+                refresh.append(replace(job, refresh_stages=missing))
+        skipped = len(jobs) - len(pending) - len(refresh)
+        if skipped:
+            print(f"跳过 {skipped} 张未变化的图片。")
+        if refresh:
+            print(f"{len(refresh)} 张图片的输出已是最新，只补跑分析阶段。")
+        jobs = pending + refresh
+    if not jobs:
+        if cache is not None:
+            cache.save()
+        return results
+
+    for job in jobs:
+        if job.variants:
+            job.variant_path(job.variants[0]).parent.mkdir(parents=True, exist_ok=True)
+
+    worker_count = min(resolve_worker_count(workers), len(jobs))
+    memory_budget = resolve_memory_budget(memory_mb)
+    with tqdm(total=len(jobs), desc=desc) as pbar:
+        known_qualities = cache.qualities if cache is not None else {}
+        on_result = None
+        if cache is not None:
+            def on_result(result: CompressResult) -> None:
+                if result.ok and result.fingerprint is not None:
+                    cache.checkpoint(result.job, result.fingerprint, result.outputs, result.meta)
+
+        results = _run_pipeline(
+            jobs, worker_count, max(1, io_threads), pbar, known_qualities, memory_budget, on_result
+        )
+
+    for result in results:
+        if not result.ok:
+            print(f"⚠️ 压缩失败：{result.job.source.name}（{result.error}）")
+    if cache is not None:
+        cache.save()
+    _print_decode_comparison(results)
+    _print_quality_summary(results)
+    _print_encode_report(results)
+    _print_color_report(results)
+    _print_stage_report(results)
+    if cache is not None:
+        _print_ssim_summary(cache.ssim_scores())
+    if memory_budget is not None:
+        _print_memory_report(results, memory_budget)
+    return results
+
+
+class _MemoryGate:
+    """Byte-counting semaphore: blocks until an estimate fits under the budget.
+
+    An estimate larger than the whole budget waits for every other image to
+    finish and then runs alone.
+    """
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.used = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, amount: int) -> int:
+        amount = min(amount, self.budget)
+        with self._condition:
+            while self.used and self.used + amount > self.budget:
+                self._condition.wait()
+            self.used += amount
+        return amount
+
+    def release(self, amount: int) -> None:
+        with self._condition:
+            self.used -= amount
+            self._condition.notify_all()
+
+
+def estimate_job_memory(job: CompressJob, oversize_threshold: int | None = None) -> Tuple[int, bool]:
+    """Estimate peak bytes for encoding ``job`` from the source header alone.
+
+    Returns ``(estimate, oversized)``. A source is oversized when its planned
+    decode would exceed ``oversize_threshold`` or it trips Pillow's
+    decompression-bomb guard; oversized JPEGs are decoded through draft mode
+    even in exact mode, so the estimate already assumes the reduced scale.
+    Other formats (PNG, TIFF, ...) have no reduced-scale decode and are
+    budgeted at their full decode size; one larger than the whole budget
+    runs alone.
+    """
+    try:
+        file_size = job.source.stat().st_size
+        # 只读文件头；放开像素上限才能拿到超大图的真实尺寸
+        with open_unguarded(job.source) as img:
+            size, fmt = img.size, img.format
+    except (OSError, UnidentifiedImageError):
+        return 0, False  # 交给读取阶段或 worker 报告具体错误
+
+    def estimate(fast: bool) -> int:
+        final = thumbnail_size(size, job.target_size)
+        decoded = size
+        if fast and fmt == "JPEG" and final != size:
+            decoded = jpeg_draft_size(size, (math.ceil(final[0] * DRAFT_GAP), math.ceil(final[1] * DRAFT_GAP)))
+        # 解码帧 + convert/reduce 的副本，加上最终尺寸的若干帧（各宽度变体、编码缓冲）
+        return file_size + (decoded[0] * decoded[1] * 2 + final[0] * final[1] * 3) * BYTES_PER_PIXEL
+
+    planned = estimate(job.decode_mode != "exact")
+    too_many_pixels = Image.MAX_IMAGE_PIXELS is not None and size[0] * size[1] > Image.MAX_IMAGE_PIXELS
+    oversized = too_many_pixels or (oversize_threshold is not None and planned > oversize_threshold)
+    return (estimate(True) if oversized else planned), oversized
+
+
+def worker_pool(max_workers: int) -> ProcessPoolExecutor:
+    """A process pool whose workers are never forked from this (multi-threaded) process.
+
+    Under the ``fork`` start method a worker forked while a reader or writer
+    thread holds a lock (Pillow, the warnings filters, the allocator) inherits
+    it locked and can hang forever. ``forkserver`` forks workers from a
+    single-threaded server process instead; Windows only has ``spawn``.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+
+def jpeg_draft_size(size: Tuple[int, int], requested: Tuple[int, int]) -> Tuple[int, int]:
+    """The size libjpeg's DCT scaling yields for ``Image.draft(requested)``, mirroring Pillow."""
+    scale = min(size[0] // requested[0], size[1] // requested[1])
+    for factor in (8, 4, 2, 1):
+        if scale >= factor:
+            break
+    return (size[0] + factor - 1) // factor, (size[1] + factor - 1) // factor
+
+
+def _run_pipeline(
+    jobs: List[CompressJob],
+    worker_count: int,
+    io_threads: int,
+    pbar: tqdm,
+    known_qualities: Dict[str, Dict[str, int]] | None = None,
+    memory_budget: int | None = None,
+    on_result: Callable[[CompressResult], None] | None = None,
+) -> List[CompressResult]:
+    gate = _MemoryGate(memory_budget) if memory_budget is not None else None
+    # 单张估算超过每个 worker 的平均份额即视为超大图
+    oversize_threshold = memory_budget // worker_count if memory_budget is not None else None
+    depth = worker_count * QUEUE_DEPTH_PER_WORKER
+    job_queue: queue.Queue = queue.Queue()
+    encode_queue: queue.Queue = queue.Queue(maxsize=depth)
+    inflight_queue: queue.Queue = queue.Queue(maxsize=depth)
+    write_queue: queue.Queue = queue.Queue(maxsize=depth)
+    done_queue: queue.Queue = queue.Queue()
+    for item in enumerate(jobs):
+        job_queue.put(item)
+    # 内存估算只读文件头，在启动任何线程与 worker 之前于主线程完成：
+    # catch_warnings 会改动进程全局的警告过滤器，Pillow 也不应与派生进程的时刻重叠
+    estimates: Dict[int, Tuple[int, bool]] = {}
+    if gate is not None:
+        estimates = {index: estimate_job_memory(job, oversize_threshold) for index, job in enumerate(jobs)}
+
+    # 主线程按任务数等待 done_queue，所以每个阶段对任何异常都要记一条失败结果再继续，
+    # 否则阶段线程悄悄退出，整个构建就永远卡住
+    def fail(index: int, job: CompressJob, exc: BaseException) -> None:
+        done_queue.put((index, CompressResult(job=job, error=f"{type(exc).__name__}: {exc}")))
+
+    def read_stage() -> None:
+        while True:
+            try:
+                index, job = job_queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                data = job.source.read_bytes()
+                fingerprint = _fingerprint_bytes(job.source, data)
+                if job.quality_target is not None and known_qualities:
+                    chosen = known_qualities.get(fingerprint["sha256"], {}).get(job.quality_target.key())
+                    job.searched_quality = chosen
+            except Exception as exc:  # noqa: BLE001
+                fail(index, job, exc)
+                continue
+            estimate, oversized = estimates.get(index, (0, False))
+            encode_queue.put((index, job, data, fingerprint, estimate, oversized))
+
+    def close_read_stage(readers: List[threading.Thread]) -> None:
+        for reader in readers:
+            reader.join()
+        encode_queue.put(_PIPELINE_DONE)
+
+    def dispatch_stage(pool: ProcessPoolExecutor) -> None:
+        while True:
+            item = encode_queue.get()
+            if item is _PIPELINE_DONE:
+                inflight_queue.put(_PIPELINE_DONE)
+                return
+            index, job, data, fingerprint, estimate, oversized = item
+            reserved = 0
+            try:
+                reserved = gate.acquire(estimate) if gate is not None else 0
+                future = pool.submit(_encode_job, job, data, oversized=oversized)
+            except Exception as exc:  # noqa: BLE001  进程池已损坏、任务无法序列化等
+                if gate is not None:
+                    gate.release(reserved)
+                fail(index, job, exc)
+                continue
+            inflight_queue.put((index, job, fingerprint, future, reserved, estimate))
+
+    def collect_stage() -> None:
+        while True:
+            item = inflight_queue.get()
+            if item is _PIPELINE_DONE:
+                for _ in range(io_threads):
+                    write_queue.put(_PIPELINE_DONE)
+                return
+            index, job, fingerprint, future, reserved, estimate = item
+            try:
+                files, outputs, meta = future.result()
+                if gate is not None and "memory_report" in meta:
+                    meta["memory_report"]["estimate"] = estimate
+                result = CompressResult(job=job, fingerprint=fingerprint, outputs=outputs, meta=meta)
+            except Exception as exc:  # noqa: BLE001
+                fail(index, job, exc)
+                continue
+            finally:
+                if gate is not None:
+                    gate.release(reserved)
+            write_queue.put((index, result, files))
+
+    def write_stage() -> None:
+        while True:
+            item = write_queue.get()
+            if item is _PIPELINE_DONE:
+                return
+            index, result, files = item
+            try:
+                _write_files(files)
+            except Exception as exc:  # noqa: BLE001
+                fail(index, result.job, exc)
+                continue
+            done_queue.put((index, result))
+
+    ordered: List[CompressResult | None] = [None] * len(jobs)
+    with worker_pool(worker_count) as pool:
+        readers = [threading.Thread(target=read_stage, daemon=True) for _ in range(io_threads)]
+        threads = readers + [
+            threading.Thread(target=close_read_stage, args=(readers,), daemon=True),
+            threading.Thread(target=dispatch_stage, args=(pool,), daemon=True),
+            threading.Thread(target=collect_stage, daemon=True),
+        ] + [threading.Thread(target=write_stage, daemon=True) for _ in range(io_threads)]
+        for thread in threads:
+            thread.start()
+        for _ in jobs:
+            index, result = done_queue.get()
+            ordered[index] = result
+            if on_result is not None:
+                on_result(result)
+            pbar.update(1)
+        for thread in threads:
+            thread.join()
+    return [result for result in ordered if result is not None]
+
+
+def plan_batch(
+    jobs: Iterable[CompressJob],
+    cache: BuildCache,
+    *,
+    removed: Iterable[str | os.PathLike] = (),
+) -> BuildPlan:
+    """Dry run of :func:`compress_batch`: classify every job without decoding or writing anything.
+
+    Freshness uses the same cache checks as a real build, except that old
+    derivatives without a cache entry are judged by mtime instead of being
+    adopted; pass a cache loaded with ``read_only=True`` so nothing is
+    adopted, updated or printed. Source sizes come from headers only.
+    ``removed`` lists derivatives the caller would delete. The returned plan
+    carries the throughput measured in earlier builds.
+    """
+    plan = BuildPlan()
+    profile_name = DEFAULT_PROFILE
+    for job in jobs:
+        profile_name = job.profile.name
+        if cache.is_fresh(job):
+            plan.skip.append(job)
+            continue
+        try:
+            size = read_image_size(job.source)
+        except (OSError, UnidentifiedImageError) as exc:
+            print(f"⚠️ 无法读取 {job.source.name} 的文件头（{exc}），构建时会失败。")
+            continue
+        plan.encode.append((job, size, job.source.stat().st_size))
+    for destination in removed:
+        plan.delete.append((Path(destination), cache.shipped_bytes(destination)))
+    plan.throughput = measured_throughput(cache.project_dir, profile_name)
+    return plan
+
+
+def print_plan(plan: BuildPlan, workers: int | None = None) -> None:
+    mb = 1024 * 1024
+    source_bytes = sum(size for _, _, size in plan.encode)
+    print(
+        f"构建计划：编码 {len(plan.encode)} 张（{plan.megapixels:.0f} MP，源文件 {source_bytes / mb:.1f} MB），"
+        f"跳过 {len(plan.skip)} 张，删除 {len(plan.delete)} 张（释放 {sum(size for _, size in plan.delete) / mb:.1f} MB）"
+    )
+    for job, (width, height), size in plan.encode:
+        print(f"  编码  {job.source.name}  {width}×{height}  {size / mb:.1f} MB")
+    for destination, size in plan.delete:
+        print(f"  删除  {destination.name}  {size / mb:.1f} MB")
+    if not plan.encode:
+        return
+    throughput = plan.throughput
+    if throughput is None:
+        print("⚠️ 还没有历史吞吐数据，无法估算耗时与输出体积；正常构建一次后即可估算。")
+        return
+    cpu_seconds = [
+        width * height / 1_000_000 * throughput["seconds_per_megapixel"] for _, (width, height), _ in plan.encode
+    ]
+    worker_count = min(resolve_worker_count(workers), len(plan.encode))
+    # 单张图片不能拆给多个 worker，墙钟时间至少是最慢那张
+    wall = max(sum(cpu_seconds) / worker_count, max(cpu_seconds))
+    output_bytes = plan.megapixels * throughput["bytes_per_megapixel"]
+    print(
+        f"预计 CPU 时间 {_format_seconds(sum(cpu_seconds))}，{worker_count} 个 worker 约 {_format_seconds(wall)}，"
+        f"输出约 {output_bytes / mb:.1f} MB"
+        f"（依据{throughput['scope']} {throughput['samples']} 张图片的历史吞吐：{throughput['seconds_per_megapixel']:.2f}s/MP）"
+    )
+
+
+def measured_throughput(project_dir: str | os.PathLike, profile_name: str) -> Dict[str, object] | None:
+    """Worker seconds and output bytes per source megapixel, from the ``cost`` recorded by earlier builds.
+
+    The project's own entries are used when there are enough of them;
+    otherwise every project next to it contributes. Only builds with the
+    same encoder profile count, since profiles differ a lot in cost.
+    """
+    project_dir = Path(project_dir)
+    samples = _cost_samples([project_dir], profile_name)
+    scope = "本项目"
+    if len(samples) < PLAN_MIN_SAMPLES and project_dir.parent.is_dir():
+        samples = _cost_samples(sorted(path for path in project_dir.parent.iterdir() if path.is_dir()), profile_name)
+        scope = "所有项目"
+    megapixels = sum(cost["megapixels"] for cost in samples)
+    if not megapixels:
+        return None
+    return {
+        "seconds_per_megapixel": sum(cost["seconds"] for cost in samples) / megapixels,
+        "bytes_per_megapixel": sum(cost["bytes"] for cost in samples) / megapixels,
+        "samples": len(samples),
+        "scope": scope,
+    }
+
+
+def _cost_samples(project_dirs: Iterable[Path], profile_name: str) -> List[Dict[str, float]]:
+    samples = []
+    for project_dir in project_dirs:
+        if not (project_dir / CACHE_FILENAME).exists():
+            continue
+        for entry in BuildCache.load(project_dir, read_only=True).entries.values():
+            cost = entry.get("cost")
+            profile = entry.get("settings", {}).get("profile") or [None]
+            if cost and cost.get("megapixels") and profile[0] == profile_name:
+                samples.append(cost)
+    return samples
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    minutes, seconds = divmod(round(seconds), 60)
+    return f"{minutes}m{seconds:02d}s" if minutes < 60 else f"{minutes // 60}h{minutes % 60:02d}m"
+
+
+def _print_decode_comparison(results: List[CompressResult]) -> None:
+    reports = [result.meta["decode_report"] for result in results if "decode_report" in result.meta]
+    if not reports:
+        return
+    exact = sum(report["exact_seconds"] for report in reports)
+    fast = sum(report["fast_seconds"] for report in reports)
+    worst = min(reports, key=lambda report: report["psnr"])
+    print(f"解码对比（{len(reports)} 张）：exact {exact:.2f}s，fast {fast:.2f}s，加速 {exact / max(fast, 1e-9):.1f}x")
+    print(f"  解码像素减少 {sum(r['exact_pixels'] for r in reports) / sum(r['fast_pixels'] for r in reports):.1f}x，最低 PSNR {worst['psnr']:.1f} dB")
+
+
+def _print_memory_report(results: List[CompressResult], budget: int) -> None:
+    reports = [result.meta["memory_report"] for result in results if "memory_report" in result.meta]
+    if not reports:
+        return
+    mb = 1024 * 1024
+    largest = max(report.get("estimate", 0) for report in reports)
+    reduced = sum(1 for report in reports if report["oversized"] and not report.get("full_decode"))
+    full = [result.job.source.name for result in results if result.meta.get("memory_report", {}).get("full_decode")]
+    print(
+        f"内存预算 {budget / mb:.0f} MB：单张最大估算 {largest / mb:.0f} MB，"
+        f"{reduced} 张超大 JPEG 改用缩小解码"
+    )
+    if full:
+        print(
+            f"  ⚠️ {len(full)} 张超大的非 JPEG 图片无法缩小解码，按完整解码的大小计入预算"
+            f"（超出预算时单独运行）：{'、'.join(full)}"
+        )
+    peaks: Dict[int, int] = {}
+    for report in reports:
+        if report["peak_rss"] is not None:
+            peaks[report["pid"]] = max(peaks.get(report["pid"], 0), report["peak_rss"])
+    for pid, peak in sorted(peaks.items()):
+        print(f"  worker {pid}: 峰值 RSS {peak / mb:.0f} MB")
+
+
+def _print_encode_report(results: List[CompressResult]) -> None:
+    reports = [result.meta["encode_report"] for result in results if "encode_report" in result.meta]
+    if not reports:
+        return
+    mb = 1024 * 1024
+    for name in sorted({report["profile"] for report in reports}):
+        used = [report for report in reports if report["profile"] == name]
+        print(
+            f"编码档位 {name}（{len(used)} 张）：输出 {sum(r['bytes'] for r in used) / mb:.1f} MB，"
+            f"编码耗时 {sum(r['seconds'] for r in used):.2f}s"
+        )
+    compared = [report["compare"] for report in reports if "compare" in report]
+    if not compared:
+        return
+    # preview 即旧版的 baseline 编码，作为节省比例的参照
+    baseline = sum(report["preview"]["bytes"] for report in compared)
+    print(f"编码档位对比（全尺寸 JPEG，{len(compared)} 张）：")
+    for name in ENCODER_PROFILES:
+        size = sum(report[name]["bytes"] for report in compared)
+        seconds = sum(report[name]["seconds"] for report in compared)
+        print(f"  {name}: {size / mb:.2f} MB（相对 baseline {(size - baseline) / max(baseline, 1) * 100:+.1f}%），编码 {seconds:.2f}s")
+
+
+def _print_color_report(results: List[CompressResult]) -> None:
+    reports = [result.meta["color_report"] for result in results if "color_report" in result.meta]
+    if not reports:
+        return
+    converted = [report for report in reports if report["converted"]]
+    sources: Dict[str, int] = {}
+    for report in reports:
+        sources[report["profile"]] = sources.get(report["profile"], 0) + 1
+    print(
+        f"色彩管理：{len(converted)}/{len(reports)} 张转换到 sRGB，"
+        f"构建色彩转换 {sum(1 for report in reports if report['built'])} 次"
+    )
+    for description, count in sorted(sources.items(), key=lambda item: -item[1]):
+        print(f"  {description}: {count} 张")
+
+
+def _print_stage_report(results: List[CompressResult]) -> None:
+    reports = [result.meta["stage_report"] for result in results if "stage_report" in result.meta]
+    if not reports:
+        return
+    totals: Dict[str, List[float]] = {}
+    for report in reports:
+        for name, seconds in report.items():
+            totals.setdefault(name, []).append(seconds)
+    # 阶段在 worker 内串行运行，这里是所有 worker 的累计耗时
+    print(f"各阶段耗时（{len(reports)} 张，解码一次后共用同一帧）：")
+    for name, spent in totals.items():
+        print(f"  {name}: {sum(spent):.2f}s（{len(spent)} 张，平均 {sum(spent) / len(spent) * 1000:.0f} ms）")
+
+
+def _print_ssim_summary(scores: List[Tuple[str, str, int, float]]) -> None:
+    """Per-format MS-SSIM statistics for the project, listing derivatives below :data:`SSIM_WARNING`."""
+    if not scores:
+        return
+    print(f"感知质量（MS-SSIM，{len({name for name, *_ in scores})} 张图片）：")
+    for fmt in sorted({fmt for _, fmt, _, _ in scores}):
+        values = [score for _, used, _, score in scores if used == fmt]
+        print(f"  {fmt}: {len(values)} 个衍生图，平均 {sum(values) / len(values):.4f}，最低 {min(values):.4f}")
+    low = sorted((score, name, fmt, width) for name, fmt, width, score in scores if score < SSIM_WARNING)
+    if low:
+        print(f"⚠️ {len(low)} 个衍生图低于 {SSIM_WARNING}：")
+        for score, name, fmt, width in low[:10]:
+            print(f"  {name} {fmt} {width}px：{score:.4f}")
+
+
+def _print_quality_summary(results: List[CompressResult]) -> None:
+    reports = [result.meta["quality_report"] for result in results if "quality_report" in result.meta]
+    if not reports:
+        return
+    qualities = [report["quality"] for report in reports]
+    searched = sum(1 for report in reports if report["encodes"])
+    total = sum(report["bytes"] for report in reports)
+    print(
+        f"自适应质量（{len(reports)} 张，搜索 {searched} 张，其余沿用缓存）：quality {min(qualities)}~{max(qualities)}，"
+        f"平均 {sum(qualities) / len(qualities):.0f}；background 共 {total / 1024 / 1024:.1f} MB，"
+        f"平均 {total / len(reports) / 1024:.0f} KB/张"
+    )
+
+
+def _encode_job(
+    job: CompressJob,
+    data: bytes,
+    *,
+    oversized: bool = False,
+) -> Tuple[List[Tuple[str, bytes]], List[Dict[str, object]], Dict[str, object]]:
+    """Decode the in-memory source once and run every stage on that frame.
+
+    Runs inside a pool worker and never touches the disk; the encoded files
+    are returned as ``(path, bytes)`` pairs for the writer threads, together
+    with per-image metadata (placeholder, stage results, reports) for the
+    cache. The built-in stages produce the background JPEG, its variants and
+    the slideshow frame; ``job.stages`` run afterwards on the same frame.
+    A job with ``refresh_stages`` only re-runs those stages and writes nothing.
+    ``oversized`` sources were already budgeted by the memory gate, so the
+    decompression-bomb guard is lifted and the reduced-scale decode is forced.
+    """
+    started = time.perf_counter()
+    try:
+        img = open_unguarded(io.BytesIO(data)) if oversized else Image.open(io.BytesIO(data))
+    except UnidentifiedImageError:
+        raise UnidentifiedImageError(f"cannot identify image file {job.source.name!r}") from None
+    with img:
+        source_size, source_format = img.size, img.format
+        transpose = ORIENTATION_TRANSPOSE.get(img.getexif().get(EXIF_ORIENTATION))
+        metadata = job.profile.metadata_for(img)
+        rgb = decode_thumbnail(img, job.target_size, fast=oversized or job.decode_mode != "exact")
+    # 只在缩小后的帧上转正一次：所有衍生图、占位图、雪碧图和记录的尺寸都与显示方向一致
+    if transpose is not None:
+        rgb = rgb.transpose(transpose)
+    ctx = StageContext(job=job, frame=rgb, metadata=metadata, source_size=source_size)
+    ctx.meta["stage_report"] = {}
+    if job.refresh_stages:
+        # 只补跑缺失的分析阶段；颜色转换会改变像素，仍要先做
+        stages = (BUILTIN_STAGES[0],) + tuple(stage for stage in job.stages if stage.name in job.refresh_stages)
+    else:
+        stages = BUILTIN_STAGES + job.stages
+    for stage in stages:
+        stage_started = time.perf_counter()
+        result = stage.run(ctx)
+        ctx.meta["stage_report"][stage.name] = time.perf_counter() - stage_started
+        if result is not None:
+            ctx.meta.setdefault("stages", {})[stage.name] = {"version": stage.version, **result}
+
+    meta = ctx.meta
+    if job.refresh_stages:
+        # 补跑时颜色转换只是前置步骤，不汇报
+        return [], [], {name: meta[name] for name in ("stages", "stage_report") if name in meta}
+    # 构建计划据此估算之后的耗时与输出体积；对比类的额外开销不计入
+    meta["cost"] = {
+        "seconds": round(time.perf_counter() - started, 3),
+        "megapixels": round(source_size[0] * source_size[1] / 1_000_000, 3),
+        "bytes": sum(len(payload) for _, payload in ctx.files),
+    }
+    if job.decode_mode == "compare" and not oversized:
+        meta["decode_report"] = compare_decode_paths(io.BytesIO(data), job.target_size)
+    meta["memory_report"] = {
+        "pid": os.getpid(),
+        "peak_rss": peak_rss(),
+        "oversized": oversized,
+        # 只有 JPEG 能按比例解码，其他格式的超大图仍是完整解码
+        "full_decode": oversized and source_format != "JPEG",
+    }
+    meta["encode_report"] = {
+        "profile": job.profile.name,
+        "seconds": ctx.encode_seconds,
+        "bytes": sum(len(payload) for _, payload in ctx.files),
+    }
+    if job.compare_profiles:
+        meta["encode_report"]["compare"] = compare_profiles(ctx.frame, ctx.jpeg_quality, ctx.metadata)
+    return ctx.files, ctx.outputs, meta
+
+
+def _color_stage(ctx: StageContext) -> None:
+    job = ctx.job
+    if job.color_mode == "keep":
+        return
+    # 在缩小后的帧上做色彩转换，占位图、模糊图和各尺寸变体都基于转换后的像素
+    ctx.frame, ctx.meta["color_report"] = convert_to_srgb(ctx.frame, ctx.metadata.get("icc_profile"))
+    if job.color_mode == "srgb":
+        ctx.metadata["icc_profile"] = srgb_profile_bytes()
+    else:
+        ctx.metadata.pop("icc_profile", None)
+
+
+def _placeholder_stage(ctx: StageContext) -> None:
+    ctx.meta["placeholder"] = make_placeholder(ctx.frame)
+
+
+def _background_stage(ctx: StageContext) -> None:
+    job = ctx.job
+    if job.quality_target is not None:
+        encodes = 0
+        ctx.jpeg_quality = job.searched_quality
+        if ctx.jpeg_quality is None:
+            ctx.jpeg_quality, encodes = search_quality(
+                ctx.frame, job.quality_target, save_options=job.profile.save_options("JPEG", ctx.metadata)
+            )
+        ctx.meta["quality"] = ctx.jpeg_quality
+    payload = ctx.emit(job.destination, ctx.frame, "JPEG", ctx.jpeg_quality)
+    if job.quality_target is not None:
+        ctx.meta["quality_report"] = {"quality": ctx.jpeg_quality, "encodes": encodes, "bytes": len(payload)}
+
+
+def _variants_stage(ctx: StageContext) -> None:
+    job = ctx.job
+    resized: Dict[int, Image.Image] = {}
+    for variant in job.variants:
+        frame = resized.get(variant.width)
+        if frame is None:
+            frame = fit_width(ctx.frame, variant.width, job.target_size)
+            resized[variant.width] = frame
+        # 自适应模式下 JPEG 变体沿用为全尺寸图选出的质量，AVIF/WebP 保持各自的固定质量
+        quality = ctx.jpeg_quality if variant.format == "JPEG" else variant.quality
+        ctx.emit(job.variant_path(variant), frame, variant.format, quality)
+
+
+def _slideshow_stage(ctx: StageContext) -> None:
+    if ctx.job.slideshow_blur:
+        ctx.emit(ctx.job.blur_path(), make_slideshow_blur(ctx.frame), "JPEG", SLIDESHOW_BLUR_QUALITY, role="slideshow")
+
+
+BUILTIN_STAGES = (
+    Stage("color", _color_stage),
+    Stage("placeholder", _placeholder_stage),
+    Stage("background", _background_stage, writes_files=True),
+    Stage("variants", _variants_stage, writes_files=True),
+    Stage("slideshow", _slideshow_stage, writes_files=True),
+)
+
+
+def convert_to_srgb(img: Image.Image, icc_profile: bytes | None) -> Tuple[Image.Image, Dict[str, object]]:
+    """Convert an RGB frame from its embedded ICC profile to sRGB.
+
+    Transforms are built once per distinct profile in each worker process
+    and reused for every later image with the same profile. Untagged
+    frames are treated as sRGB, sRGB-tagged ones skip the transform, and
+    non-RGB profiles (e.g. CMYK, already flattened during decode) are left
+    unconverted.
+    """
+    if not icc_profile or img.mode != "RGB":
+        return img, {"profile": "untagged", "converted": False, "built": False}
+    key = hashlib.sha1(icc_profile).hexdigest()
+    built = False
+    cached = _COLOR_TRANSFORMS.get(key)
+    if cached is None:
+        source = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+        description = (source.profile.profile_description or "unknown").strip()
+        transform = None
+        if source.profile.xcolor_space.strip() == "RGB" and "srgb" not in description.lower():
+            transform = ImageCms.buildTransform(
+                source, _srgb_profile(), "RGB", "RGB", renderingIntent=ImageCms.Intent.PERCEPTUAL
+            )
+            built = True
+        if len(_COLOR_TRANSFORMS) >= COLOR_TRANSFORM_LIMIT:
+            _COLOR_TRANSFORMS.pop(next(iter(_COLOR_TRANSFORMS)))
+        cached = _COLOR_TRANSFORMS[key] = (description, transform)
+    description, transform = cached
+    if transform is not None:
+        img = ImageCms.applyTransform(img, transform)
+    return img, {"profile": description, "converted": transform is not None, "built": built}
+
+
+def srgb_profile_bytes() -> bytes:
+    """LittleCMS's built-in sRGB profile, ~600 bytes instead of the ~3 KB camera profiles."""
+    if "bytes" not in _SRGB_PROFILE:
+        _SRGB_PROFILE["bytes"] = _srgb_profile().tobytes()
+    return _SRGB_PROFILE["bytes"]
+
+
+def _srgb_profile():
+    if "profile" not in _SRGB_PROFILE:
+        _SRGB_PROFILE["profile"] = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB"))
+    return _SRGB_PROFILE["profile"]
+
+
+def compare_profiles(img: Image.Image, quality: int, metadata: Dict[str, bytes]) -> Dict[str, Dict[str, float]]:
+    """Encode one frame as JPEG with every profile and report bytes and encode time for each."""
+    report: Dict[str, Dict[str, float]] = {}
+    for name, profile in ENCODER_PROFILES.items():
+        kept = {key: value for key, value in metadata.items() if key == "icc_profile" or profile.metadata != "none"}
+        start = time.perf_counter()
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=quality, **profile.save_options("JPEG", kept))
+        report[name] = {"bytes": buffer.tell(), "seconds": time.perf_counter() - start}
+    return report
+
+
+def peak_rss() -> int | None:
+    """Peak resident set size of the current process in bytes, if the platform reports it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def search_quality(
+    img: Image.Image,
+    target: QualityTarget,
+    *,
+    save_options: Dict[str, object] | None = None,
+) -> Tuple[int, int]:
+    """Binary-search the JPEG quality for ``img``; returns ``(quality, encodes_used)``.
+
+    Size and PSNR both grow monotonically with quality (give or take encoder
+    noise), so each constraint is a bisection over the allowed range and
+    every quality is encoded at most once.
+    """
+    encoded: Dict[int, bytes] = {}
+
+    def encode(quality: int) -> bytes:
+        if quality not in encoded:
+            buffer = io.BytesIO()
+            img.save(buffer, "JPEG", quality=quality, **(save_options or {}))
+            encoded[quality] = buffer.getvalue()
+        return encoded[quality]
+
+    def meets_floor(quality: int) -> bool:
+        with Image.open(io.BytesIO(encode(quality))) as decoded:
+            decoded = decoded.convert("RGB")
+        if target.min_psnr is not None and psnr(img, decoded) < target.min_psnr:
+            return False
+        if target.min_ssim is not None:
+            from image_analysis import ms_ssim  # 只有 SSIM 目标需要 numpy
+
+            return ms_ssim(img, decoded) >= target.min_ssim
+        return True
+
+    low, high = target.min_quality, target.max_quality
+    chosen = high
+    if target.min_psnr is not None or target.min_ssim is not None:
+        # 满足 PSNR / MS-SSIM 下限的最低质量；最高质量也达不到时用最高质量
+        lo, hi = low, high
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if meets_floor(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        chosen = lo
+    if target.max_bytes is not None and len(encode(chosen)) > target.max_bytes:
+        # 预算内的最高质量；最低质量也超预算时用最低质量
+        lo, hi = low, chosen
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if len(encode(mid)) <= target.max_bytes:
+                lo = mid
+            else:
+                hi = mid - 1
+        chosen = lo
+    return chosen, len(encoded)
+
+
+def derivative_ssim(reference: Image.Image, encoded: bytes) -> float:
+    """MS-SSIM of an encoded derivative against the frame it was encoded from."""
+    from image_analysis import ms_ssim  # image_analysis 依赖 numpy，并反过来导入本模块
+
+    with Image.open(io.BytesIO(encoded)) as decoded:
+        return ms_ssim(reference, decoded.convert("RGB"))
+
+
+def psnr(first: Image.Image, second: Image.Image) -> float:
+    diff = ImageChops.difference(first, second)
+    mse = sum(value ** 2 for value in ImageStat.Stat(diff).rms) / len(diff.getbands())
+    return 99.0 if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def make_slideshow_blur(img: Image.Image) -> Image.Image:
+    """A tiny pre-blurred frame for the background slideshow, which CSS scales up to cover the viewport."""
+    frame = img.copy()
+    frame.thumbnail((SLIDESHOW_BLUR_WIDTH, SLIDESHOW_BLUR_WIDTH), Image.Resampling.BOX)
+    return frame.filter(ImageFilter.GaussianBlur(SLIDESHOW_BLUR_RADIUS))
+
+
+def make_placeholder(img: Image.Image) -> Dict[str, str]:
+    """A ~16px JPEG data URI plus the average colour of ``img``."""
+    tiny = img.convert("RGB")
+    tiny.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BOX)
+    red, green, blue = tiny.resize((1, 1), Image.Resampling.BOX).getpixel((0, 0))
+    buffer = io.BytesIO()
+    tiny.save(buffer, "JPEG", quality=PLACEHOLDER_QUALITY, optimize=True)
+    encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
+    return {
+        "color": f"#{red:02x}{green:02x}{blue:02x}",
+        "data_uri": f"data:image/jpeg;base64,{encoded}",
+    }
+
+
+def _write_files(files: List[Tuple[str, bytes]]) -> None:
+    for path, payload in files:
+        atomic_write(path, payload)
+
+
+def atomic_write(path: str | os.PathLike, data: bytes | str) -> None:
+    """Write ``data`` to a temporary sibling file and rename it over ``path``.
+
+    Readers only ever see the previous file or the complete new one; a
+    crash, Ctrl+C or full disk mid-write leaves no half-written output.
+    Text is written as UTF-8.
+    """
+    path = Path(path)
+    payload = data.encode("utf-8") if isinstance(data, str) else data
+    temporary = path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        with open(temporary, "wb") as handle:
+            handle.write(payload)
+        os.replace(temporary, path)
+    except BaseException:
+        temporary.unlink(missing_ok=True)
+        raise
+
+
+def decode_thumbnail(img: Image.Image, target_size: Tuple[int, int], *, fast: bool = True) -> Image.Image:
+    """Decode ``img`` into an RGB image that fits inside ``target_size``.
+
+    The exact path decodes every source pixel before shrinking. The fast path
+    lets libjpeg decode at 1/2, 1/4 or 1/8 scale (Pillow's draft mode), then
+    ``reduce()`` box-shrinks by an integer factor, and only the last step is a
+    LANCZOS resample. Draft stops at ``DRAFT_GAP`` and reduce at ``REDUCING_GAP``
+    times the final size.
+    """
+    final_size = thumbnail_size(img.size, target_size)
+    if not fast:
+        rgb = img.convert("RGB")  # 保证是RGB模式
+        rgb.thumbnail(target_size)
+        return rgb
+
+    if img.format == "JPEG" and final_size != img.size:
+        img.draft("RGB", (math.ceil(final_size[0] * DRAFT_GAP), math.ceil(final_size[1] * DRAFT_GAP)))
+    rgb = img.convert("RGB")
+    floor = (math.ceil(final_size[0] * REDUCING_GAP), math.ceil(final_size[1] * REDUCING_GAP))
+    factor = min(rgb.width // floor[0], rgb.height // floor[1])
+    if factor > 1:
+        rgb = rgb.reduce(factor)
+    if rgb.size != final_size:
+        rgb = rgb.resize(final_size, Image.Resampling.LANCZOS)
+    return rgb
+
+
+def thumbnail_size(size: Tuple[int, int], box: Tuple[int, int]) -> Tuple[int, int]:
+    """The size ``Image.thumbnail(box)`` would produce, without touching pixels."""
+    width, height = size
+    x, y = box
+    if x >= width and y >= height:
+        return size
+    aspect = width / height
+
+    def round_aspect(number: float, key) -> int:
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
+
+
+def compare_decode_paths(source: str | os.PathLike | IO[bytes], target_size: Tuple[int, int] = DEFAULT_TARGET_SIZE) -> Dict[str, float]:
+    """Run both decode paths on one file and report their timing and PSNR."""
+    frames = {}
+    report: Dict[str, float] = {}
+    for mode in ("exact", "fast"):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        start = time.perf_counter()
+        with Image.open(source) as img:
+            frames[mode] = decode_thumbnail(img, target_size, fast=mode == "fast")
+            decoded = img.im.size
+        report[f"{mode}_seconds"] = time.perf_counter() - start
+        report[f"{mode}_pixels"] = decoded[0] * decoded[1]
+    report["psnr"] = psnr(frames["exact"], frames["fast"])
+    return report
+
+
+def fit_width(img: Image.Image, width: int, target_size: Tuple[int, int]) -> Image.Image:
+    box = (width, round(width * target_size[1] / target_size[0]))
+    if img.width <= box[0] and img.height <= box[1]:
+        return img
+    frame = img.copy()
+    frame.thumbnail(box)
+    return frame
+
+
+def _output_info(path: Path, fmt: str, size: Tuple[int, int], role: str | None = None) -> Dict[str, object]:
+    info: Dict[str, object] = {"path": str(path), "format": fmt, "width": size[0], "height": size[1]}
+    if role is not None:
+        info["role"] = role  # 不参与 srcset 的专用衍生图
+    return info
+
+
+def _fingerprint_bytes(source: Path, data: bytes) -> Dict[str, object]:
+    stat = source.stat()
+    return {
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "size": len(data),
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def fingerprint_source(source: str | os.PathLike) -> Dict[str, object]:
+    stat = os.stat(source)
+    return {
+        "sha256": hash_file(source),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def read_image_size(path: str | os.PathLike) -> Tuple[int, int]:
+    """Pixel size from the file header; Pillow does not decode until pixels are accessed."""
+    with Image.open(path) as img:
+        return img.size
+
+
+def open_unguarded(source: str | os.PathLike | io.BytesIO) -> Image.Image:
+    """``Image.open`` with the decompression-bomb guard lifted, for our own oversized originals."""
+    pixel_limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        return Image.open(source)
+    finally:
+        Image.MAX_IMAGE_PIXELS = pixel_limit
+
+
+def hash_file(path: str | os.PathLike) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def render_picture(img_attrs: str, srcsets: Dict[str, str], sizes: str, *, lazy: bool = True) -> str:
+    """Wrap an existing ``<img>`` attribute string in ``<picture>`` with responsive sources.
+
+    Lazy pages get ``data-srcset`` so their IntersectionObserver can promote it
+    together with ``data-src``. Without any srcset the plain ``<img>`` is returned.
+    """
+    if not srcsets:
+        return f"<img {img_attrs}>"
+    attr = "data-srcset" if lazy else "srcset"
+    sources = "".join(
+        f'<source type="{FORMAT_MIME_TYPES[fmt]}" {attr}="{srcset}" sizes="{sizes}">'
+        for fmt, srcset in srcsets.items()
+        if fmt != "JPEG"
+    )
+    fallback = srcsets.get("JPEG")
+    extra = f' {attr}="{fallback}" sizes="{sizes}"' if fallback else ""
+    return f"<picture>{sources}<img {img_attrs}{extra}></picture>"
+
+
+class BuildJournal:
+    """Append-only checkpoint log of finished build work for one project.
+
+    Every record is one JSON line, flushed and fsynced as soon as the work
+    it describes is complete: a finished derivative (its build-cache entry)
+    or a finished page-generation step. After an interrupted run the next
+    build replays it, so nothing that completed is done twice. A torn last
+    line from a crash is ignored.
+    """
+
+    def __init__(self, project_dir: str | os.PathLike):
+        self.path = Path(project_dir) / JOURNAL_FILENAME
+
+    def records(self) -> List[Dict[str, object]]:
+        if not self.path.exists():
+            return []
+        records = []
+        with open(self.path, encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict):
+                    records.append(record)
+        return records
+
+    def append(self, record: Dict[str, object]) -> None:
+        with open(self.path, "a", encoding="utf-8") as handle:
+            handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    def steps(self) -> Dict[str, Dict[str, object]]:
+        """Completed page-generation steps and the data recorded with each."""
+        return {record["step"]: record.get("data", {}) for record in self.records() if "step" in record}
+
+    def mark_step(self, name: str, data: Dict[str, object] | None = None) -> None:
+        self.append({"step": name, "data": data or {}})
+
+    def compact(self) -> None:
+        """Drop derivative records once the build cache holds them, keeping step records."""
+        steps = [record for record in self.records() if "step" in record]
+        if not steps:
+            self.clear()
+        elif self.path.exists():
+            atomic_write(self.path, "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in steps))
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+class BuildCache:
+    """Per-project manifest of derivatives, stored as ``.mainquest-cache.json``.
+
+    Each entry is keyed by the derivative path relative to the project folder
+    and remembers the source's content hash, size, mtime and the encoder
+    settings used. Unchanged size + mtime is trusted without re-hashing; a
+    touched file is re-hashed so a pure mtime bump does not force a rebuild.
+    Adaptive JPEG qualities are kept by source hash and quality target, so a
+    search runs once per photo content even if its settings change later.
+    Analysis results (perceptual hashes and the like) are kept per file and
+    trusted while that file's size and mtime are unchanged; image quality
+    scores are kept by source hash like the adaptive qualities.
+    """
+
+    def __init__(
+        self,
+        project_dir: str | os.PathLike,
+        entries: Dict[str, Dict] | None = None,
+        qualities: Dict[str, Dict[str, int]] | None = None,
+        analysis: Dict[str, Dict] | None = None,
+        scores: Dict[str, Dict[str, float]] | None = None,
+        read_only: bool = False,
+    ):
+        self.project_dir = Path(project_dir)
+        self.path = self.project_dir / CACHE_FILENAME
+        self.entries: Dict[str, Dict] = entries or {}
+        self.qualities: Dict[str, Dict[str, int]] = qualities or {}
+        self.analysis: Dict[str, Dict] = analysis or {}
+        self.scores: Dict[str, Dict[str, float]] = scores or {}
+        self.journal = BuildJournal(project_dir)
+        # 构建计划用：不解码采纳旧文件、不改条目、不输出恢复信息
+        self.read_only = read_only
+        self._dirty = False
+
+    @classmethod
+    def load(cls, project_dir: str | os.PathLike, *, read_only: bool = False) -> BuildCache:
+        path = Path(project_dir) / CACHE_FILENAME
+        entries: Dict[str, Dict] = {}
+        qualities: Dict[str, Dict[str, int]] = {}
+        analysis: Dict[str, Dict] = {}
+        scores: Dict[str, Dict[str, float]] = {}
+        if path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (json.JSONDecodeError, OSError):
+                data = {}
+            if isinstance(data, dict) and data.get("version") == CACHE_VERSION:
+                stored = data.get("entries", {})
+                if isinstance(stored, dict):
+                    entries = stored
+                searched = data.get("qualities", {})
+                if isinstance(searched, dict):
+                    qualities = searched
+                analysed = data.get("analysis", {})
+                if isinstance(analysed, dict):
+                    analysis = analysed
+                scored = data.get("scores", {})
+                if isinstance(scored, dict):
+                    scores = scored
+        cache = cls(project_dir, entries, qualities, analysis, scores, read_only=read_only)
+        cache._replay_journal()
+        return cache
+
+    def _replay_journal(self) -> None:
+        # 上次构建中断前已写完的衍生图：条目只在缓存保存前存在于 journal 中
+        replayed = 0
+        for record in self.journal.records():
+            if "derivative" not in record:
+                continue
+            self.entries[record["derivative"]] = record["entry"]
+            if "quality" in record:
+                sha, target, quality = record["quality"]
+                self.qualities.setdefault(sha, {})[target] = quality
+            replayed += 1
+        if replayed and not self.read_only:
+            print(f"从中断的构建中恢复 {replayed} 张已完成的图片。")
+            self._dirty = True
+
+    def key_for(self, path: str | os.PathLike) -> str:
+        return Path(os.path.relpath(path, self.project_dir)).as_posix()
+
+    def is_fresh(self, job: CompressJob) -> bool:
+        if not job.destination.exists():
+            return False
+        if not all(job.variant_path(variant).exists() for variant in job.variants):
+            return False
+        if job.slideshow_blur and not job.blur_path().exists():
+            return False
+        key = self.key_for(job.destination)
+        entry = self.entries.get(key)
+        stat = job.source.stat()
+        if entry is None:
+            if self.read_only:
+                # 真正构建时会解码采纳比源文件新的旧 background；计划只比较 mtime
+                return job.destination.stat().st_mtime_ns >= stat.st_mtime_ns
+            return self._adopt_existing(job, stat)
+        if entry.get("source") != self.key_for(job.source):
+            return False
+        if entry.get("settings") != job.settings():
+            return False
+        if entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            return True
+        if entry.get("size") != stat.st_size or entry.get("sha256") != hash_file(job.source):
+            return False
+        if not self.read_only:
+            entry["mtime_ns"] = stat.st_mtime_ns
+            self._dirty = True
+        return True
+
+    def record(
+        self,
+        job: CompressJob,
+        fingerprint: Dict[str, object],
+        outputs: List[Dict[str, object]] | None = None,
+        meta: Dict[str, object] | None = None,
+    ) -> None:
+        key = self.key_for(job.destination)
+        if job.refresh_stages:
+            # 只补跑了分析阶段：输出、指纹与耗时记录保持不变
+            stored = self.entries[key].setdefault("stages", {})
+            stored.update((meta or {}).get("stages", {}))
+            self._dirty = True
+            return
+        recorded = [{**output, "path": self.key_for(output["path"])} for output in outputs or []]
+        # 设置变化后不再生成的旧衍生图（例如换成不含 AVIF 的档位）一并删除
+        produced = {output["path"] for output in recorded}
+        for previous in self.entries.get(key, {}).get("outputs", []):
+            stale = self.project_dir / previous["path"]
+            if previous["path"] not in produced and stale.exists():
+                stale.unlink()
+        self.entries[key] = {
+            "source": self.key_for(job.source),
+            **fingerprint,
+            "settings": job.settings(),
+            "outputs": recorded,
+            **{name: value for name, value in (meta or {}).items() if name not in TRANSIENT_META},
+        }
+        if job.quality_target is not None and meta and "quality" in meta:
+            self.qualities.setdefault(fingerprint["sha256"], {})[job.quality_target.key()] = meta["quality"]
+        self._dirty = True
+
+    def missing_stages(self, job: CompressJob) -> Tuple[str, ...]:
+        """Names of the job's analysis stages with no result, or one from an older version, in its entry."""
+        stored = self.entries.get(self.key_for(job.destination), {}).get("stages", {})
+        return tuple(
+            stage.name
+            for stage in job.stages
+            if not stage.writes_files and stored.get(stage.name, {}).get("version") != stage.version
+        )
+
+    def store_scores(self, sha256: str, values: Dict[str, float]) -> None:
+        self.scores[sha256] = values
+        self._dirty = True
+
+    def ssim_scores(self) -> List[Tuple[str, str, int, float]]:
+        """``(background name, format, width, MS-SSIM)`` for every scored derivative in the project."""
+        scores = []
+        for key, entry in sorted(self.entries.items()):
+            for output in entry.get("outputs", []):
+                if "ssim" in output:
+                    scores.append((Path(key).name, output["format"], output["width"], output["ssim"]))
+        return scores
+
+    def checkpoint(
+        self,
+        job: CompressJob,
+        fingerprint: Dict[str, object],
+        outputs: List[Dict[str, object]] | None = None,
+        meta: Dict[str, object] | None = None,
+    ) -> None:
+        """:meth:`record` a finished job and append it to the journal right away."""
+        self.record(job, fingerprint, outputs, meta)
+        key = self.key_for(job.destination)
+        record: Dict[str, object] = {"derivative": key, "entry": self.entries[key]}
+        if job.quality_target is not None and meta and "quality" in meta:
+            record["quality"] = [fingerprint["sha256"], job.quality_target.key(), meta["quality"]]
+        self.journal.append(record)
+
+    def forget(self, destination: str | os.PathLike) -> None:
+        key = self.key_for(destination)
+        if self.entries.pop(key, None) is not None:
+            self._dirty = True
+        if self.analysis.pop(key, None) is not None:
+            self._dirty = True
+
+    def analysis_for(self, path: str | os.PathLike) -> Dict[str, object] | None:
+        """Cached analysis values for ``path``, or ``None`` if missing or the file changed."""
+        stored = self.analysis.get(self.key_for(path))
+        if not stored:
+            return None
+        stat = os.stat(path)
+        if stored.get("size") != stat.st_size or stored.get("mtime_ns") != stat.st_mtime_ns:
+            return None
+        return stored.get("values")
+
+    def store_analysis(self, path: str | os.PathLike, values: Dict[str, object]) -> None:
+        """Merge ``values`` into the analysis record for ``path``, dropping values from an older version of the file."""
+        stat = os.stat(path)
+        current = self.analysis_for(path) or {}
+        self.analysis[self.key_for(path)] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "values": {**current, **values},
+        }
+        self._dirty = True
+
+    def remove(self, destination: str | os.PathLike) -> None:
+        """Delete a derivative together with its recorded variants."""
+        entry = self.entries.get(self.key_for(destination), {})
+        for output in entry.get("outputs", []):
+            path = self.project_dir / output["path"]
+            if path.exists():
+                path.unlink()
+        if os.path.exists(destination):
+            os.remove(destination)
+        self.forget(destination)
+
+    def shipped_bytes(self, destination: str | os.PathLike) -> int:
+        """Bytes on disk of a derivative together with its recorded variants."""
+        paths = {Path(destination)}
+        for output in self.entries.get(self.key_for(destination), {}).get("outputs", []):
+            paths.add(self.project_dir / output["path"])
+        return sum(path.stat().st_size for path in paths if path.exists())
+
+    def placeholder_attrs(self, destination: str | os.PathLike) -> str:
+        """Inline ``src``/``style`` attributes that paint the LQIP until the lazy loader swaps in the image."""
+        entry = self.entries.get(self.key_for(destination))
+        placeholder = entry.get("placeholder") if entry else None
+        if not placeholder:
+            return ""
+        return f' src="{placeholder["data_uri"]}" style="background-color: {placeholder["color"]}"'
+
+    def srcsets(self, destination: str | os.PathLike, url_prefix: str) -> Dict[str, str]:
+        """``{format: "url 480w, url 960w"}`` for a derivative, modern formats first."""
+        entry = self.entries.get(self.key_for(destination))
+        if not entry:
+            return {}
+        # 小图的多个宽度可能缩放到同一尺寸，同一宽度只保留一个候选
+        grouped: Dict[str, Dict[int, str]] = {}
+        for output in entry.get("outputs", []):
+            if output.get("role"):
+                continue
+            url = quote(f"{url_prefix}{output['path']}")
+            grouped.setdefault(output["format"], {}).setdefault(output["width"], url)
+        if set(grouped) == {"JPEG"} and len(grouped["JPEG"]) < 2:
+            return {}
+        order = [fmt for fmt, _ in MODERN_FORMATS] + ["JPEG"]
+        return {
+            fmt: ", ".join(f"{url} {width}w" for width, url in sorted(grouped[fmt].items()))
+            for fmt in order
+            if fmt in grouped
+        }
+
+    def slideshow_url(self, destination: str | os.PathLike, url_prefix: str) -> str | None:
+        """URL of the pre-blurred slideshow frame for a derivative, if one was built."""
+        entry = self.entries.get(self.key_for(destination), {})
+        for output in entry.get("outputs", []):
+            if output.get("role") == "slideshow":
+                return quote(f"{url_prefix}{output['path']}")
+        return None
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        # 只保留仍被某个条目引用的源文件哈希
+        live = {entry.get("sha256") for entry in self.entries.values()}
+        self.qualities = {sha: found for sha, found in self.qualities.items() if sha in live}
+        self.scores = {sha: values for sha, values in self.scores.items() if sha in live}
+        payload = {
+            "version": CACHE_VERSION,
+            "entries": self.entries,
+            "qualities": self.qualities,
+            "analysis": self.analysis,
+            "scores": self.scores,
+        }
+        atomic_write(self.path, json.dumps(payload, ensure_ascii=False, indent=2))
+        self.journal.compact()
+        self._dirty = False
+
+    def _adopt_existing(self, job: CompressJob, stat: os.stat_result) -> bool:
+        # 旧项目没有缓存：比源文件新的 background 图片视为已是最新，记录指纹后跳过
+        if job.destination.stat().st_mtime_ns < stat.st_mtime_ns:
+            return False
+        with Image.open(job.destination) as img:
+            if img.getexif().get(EXIF_ORIENTATION) not in (None, 1):
+                return False  # 靠方向标签显示的旧图，像素是横着的
+        outputs = []
+        for fmt, path in [("JPEG", job.destination)] + [
+            (variant.format, job.variant_path(variant)) for variant in job.variants
+        ]:
+            with Image.open(path) as img:
+                outputs.append(_output_info(path, fmt, img.size))
+        if job.slideshow_blur:
+            with Image.open(job.blur_path()) as img:
+                outputs.append(_output_info(job.blur_path(), "JPEG", img.size, "slideshow"))
+        with Image.open(job.destination) as img:
+            img.draft("RGB", (PLACEHOLDER_SIZE * 8, PLACEHOLDER_SIZE * 8))
+            placeholder = make_placeholder(img)
+        self.record(job, fingerprint_source(job.source), outputs, {"placeholder": placeholder})
+        return True
+
+
+def build_cover_thumbnails(
+    source: str | os.PathLike,
+    folder: str | os.PathLike,
+    *,
+    profile: EncoderProfile | None = None,
+) -> List[Dict[str, object]]:
+    """Card-sized 3:2 covers of ``source`` at 1x and 2x, in every format the profile ships.
+
+    The crop comes from :func:`image_analysis.saliency_crop_box` instead of a
+    blind centre crop, after applying the EXIF orientation so it matches what
+    browsers display. Only enough pixels for the 2x crop are decoded, and
+    sizes the source cannot fill are skipped rather than upscaled. Returns
+    output records (path, format, width, height) like the build cache's.
+    """
+    from image_analysis import saliency_crop_box  # image_analysis 依赖 numpy，并反过来导入本模块
+
+    profile = profile or ENCODER_PROFILES[DEFAULT_PROFILE]
+    source, folder = Path(source), Path(folder)
+    aspect = COVER_SIZE[0] / COVER_SIZE[1]
+    largest = max(COVER_SCALES)
+    with Image.open(source) as img:
+        icc_profile = img.info.get("icc_profile")
+        transpose = ORIENTATION_TRANSPOSE.get(img.getexif().get(EXIF_ORIENTATION))
+        width, height = img.size
+        if transpose in (Image.Transpose.TRANSPOSE, Image.Transpose.TRANSVERSE,
+                         Image.Transpose.ROTATE_90, Image.Transpose.ROTATE_270):
+            width, height = height, width
+        # 裁剪后的短边要够 2x 封面用
+        if width / height > aspect:
+            scale = COVER_SIZE[1] * largest / height
+        else:
+            scale = COVER_SIZE[0] * largest / width
+        box = img.size if scale >= 1 else (math.ceil(img.width * scale), math.ceil(img.height * scale))
+        frame = decode_thumbnail(img, box)
+    if transpose is not None:
+        frame = frame.transpose(transpose)
+    crop = frame.crop(saliency_crop_box(frame, aspect))
+
+    folder.mkdir(parents=True, exist_ok=True)
+    metadata = {"icc_profile": icc_profile} if icc_profile else {}
+    outputs: List[Dict[str, object]] = []
+    for factor in COVER_SCALES:
+        size = (COVER_SIZE[0] * factor, COVER_SIZE[1] * factor)
+        if factor > 1 and crop.width < size[0]:
+            continue
+        resized = crop if crop.size == size else crop.resize(size, Image.Resampling.LANCZOS)
+        for fmt, quality in available_formats(profile.formats):
+            path = folder / f"{source.stem}-{size[0]}.{FORMAT_EXTENSIONS[fmt]}"
+            buffer = io.BytesIO()
+            resized.save(buffer, fmt, quality=quality, **profile.save_options(fmt, metadata))
+            atomic_write(path, buffer.getvalue())
+            outputs.append(_output_info(path, fmt, size))
+    # 换了格式或尺寸后，同一张图的旧封面不再引用；只匹配 <stem>-<宽度>.<扩展名>，
+    # 不能用 <stem>-*：重建 IMG 的封面时会把 IMG-1 的封面也删掉
+    produced = {Path(output["path"]).name for output in outputs}
+    own = re.compile(rf"{re.escape(source.stem)}-\d+\.[a-z0-9]+")
+    for stale in folder.iterdir():
+        if own.fullmatch(stale.name) and stale.name not in produced:
+            stale.unlink()
+    return outputs
+
+
+def cover_picture(outputs: List[Dict[str, object]], url_prefix: str, img_attrs: str) -> str:
+    """``<picture>`` for a card cover: the 1x JPEG as ``src`` plus width descriptors for every format."""
+    srcsets: Dict[str, List[str]] = {}
+    for output in sorted(outputs, key=lambda output: output["width"]):
+        url = quote(f"{url_prefix}{Path(output['path']).name}")
+        srcsets.setdefault(output["format"], []).append(f"{url} {output['width']}w")
+    fallback = min((output for output in outputs if output["format"] == "JPEG"), key=lambda output: output["width"])
+    attrs = (
+        f'src="{quote(url_prefix + Path(fallback["path"]).name)}" loading="lazy" '
+        f'width="{fallback["width"]}" height="{fallback["height"]}" {img_attrs}'
+    )
+    return render_picture(attrs, {fmt: ", ".join(urls) for fmt, urls in srcsets.items()}, CARD_SIZES, lazy=False)
+
+
+def build_contact_sheets(
+    project_dir: str | os.PathLike,
+    *,
+    workers: int | None = None,
+    force: bool = False,
+) -> Path | None:
+    """Pack every background image of a project into sprite atlases plus ``contact.json``.
+
+    Cells are cover-cropped to ``CONTACT_CELL`` and laid out row by row,
+    ``CONTACT_CELLS_PER_SHEET`` to an atlas. The JSON records each image's
+    sheet and pixel offset. The atlases are rebuilt only when the set of
+    background files (name, size, mtime) or the layout settings change.
+    Returns the JSON path, or ``None`` when the project has no images.
+    """
+    project_dir = Path(project_dir)
+    background_dir = project_dir / "public" / "background"
+    names = list_images(background_dir, BACKGROUND_EXTENSIONS) if background_dir.exists() else []
+    if not names:
+        return None
+    contact_dir = project_dir / "public" / CONTACT_DIRNAME
+    index_path = contact_dir / CONTACT_FILENAME
+    formats = tuple((fmt, quality) for fmt, quality in CONTACT_FORMATS if fmt == "JPEG" or features.check(fmt.lower()))
+
+    signature_source = [
+        [name, (background_dir / name).stat().st_size, (background_dir / name).stat().st_mtime_ns]
+        for name in names
+    ]
+    settings = [list(CONTACT_CELL), CONTACT_COLUMNS, CONTACT_CELLS_PER_SHEET, [list(f) for f in formats]]
+    signature = hashlib.sha256(
+        json.dumps([CONTACT_VERSION, settings, signature_source]).encode("utf-8")
+    ).hexdigest()
+    if not force and index_path.exists():
+        try:
+            if json.loads(index_path.read_text(encoding="utf-8")).get("signature") == signature:
+                return index_path
+        except (json.JSONDecodeError, OSError):
+            pass
+
+    def load_cell(name: str) -> Image.Image:
+        with Image.open(background_dir / name) as img:
+            img.draft("RGB", CONTACT_CELL)
+            return ImageOps.fit(img.convert("RGB"), CONTACT_CELL, Image.Resampling.LANCZOS)
+
+    with ThreadPoolExecutor(max_workers=resolve_worker_count(workers)) as pool:
+        cells = list(pool.map(load_cell, names))
+
+    contact_dir.mkdir(parents=True, exist_ok=True)
+    cell_width, cell_height = CONTACT_CELL
+    sheets: List[Dict[str, object]] = []
+    images: List[Dict[str, object]] = []
+    for sheet_index, start in enumerate(range(0, len(cells), CONTACT_CELLS_PER_SHEET)):
+        chunk = cells[start:start + CONTACT_CELLS_PER_SHEET]
+        columns = min(CONTACT_COLUMNS, len(chunk))
+        rows = math.ceil(len(chunk) / columns)
+        sheet = Image.new("RGB", (columns * cell_width, rows * cell_height))
+        for offset, cell in enumerate(chunk):
+            x, y = (offset % columns) * cell_width, (offset // columns) * cell_height
+            sheet.paste(cell, (x, y))
+            images.append({"name": names[start + offset], "sheet": sheet_index, "x": x, "y": y})
+        files: Dict[str, object] = {"width": sheet.width, "height": sheet.height}
+        for fmt, quality in formats:
+            filename = f"contact-{sheet_index}.{FORMAT_EXTENSIONS[fmt]}"
+            buffer = io.BytesIO()
+            sheet.save(buffer, fmt, quality=quality)
+            atomic_write(contact_dir / filename, buffer.getvalue())
+            files[fmt.lower()] = filename
+        sheets.append(files)
+
+    # 图片变少时清掉多余的旧图集
+    current = {name for files in sheets for key, name in files.items() if key not in ("width", "height")}
+    for stale in contact_dir.glob("contact-*.*"):
+        if stale.name not in current:
+            stale.unlink()
+    payload = {
+        "version": CONTACT_VERSION,
+        "signature": signature,
+        "cell": list(CONTACT_CELL),
+        "sheets": sheets,
+        "images": images,
+    }
+    atomic_write(index_path, json.dumps(payload, ensure_ascii=False, indent=2))
+    return index_path
+
+
+def build_zoom_pyramids(
+    project_dir: str | os.PathLike,
+    *,
+    workers: int | None = None,
+    force: bool = False,
+) -> Path | None:
+    """Deep Zoom (DZI) tile pyramids of every original in ``public/gallery``, plus ``zoom.json``.
+
+    Each photo gets ``public/zoom/<stem>.dzi`` and ``<stem>_files/<level>/<col>_<row>.jpg``:
+    ``ZOOM_TILE_SIZE`` tiles at every level from 1×1 up to full resolution,
+    so a viewer such as OpenSeadragon fetches only the tiles on screen.
+    Photos are tiled in parallel worker processes; one whose size, mtime and
+    the tiling settings are unchanged is skipped. Originals no larger than
+    the background derivative gain nothing from zooming and are left out.
+    Returns the index path, or ``None`` when the project has no originals.
+    """
+    project_dir = Path(project_dir)
+    gallery_dir = project_dir / "public" / "gallery"
+    names = list_images(gallery_dir) if gallery_dir.exists() else []
+    if not names:
+        return None
+    zoom_dir = project_dir / "public" / ZOOM_DIRNAME
+    index_path = zoom_dir / ZOOM_FILENAME
+    settings = [ZOOM_VERSION, ZOOM_TILE_SIZE, ZOOM_OVERLAP, ZOOM_QUALITY]
+    previous: Dict[str, Dict] = {}
+    if not force and index_path.exists():
+        try:
+            data = json.loads(index_path.read_text(encoding="utf-8"))
+        except (json.JSONDecodeError, OSError):
+            data = {}
+        if isinstance(data, dict) and data.get("settings") == settings:
+            previous = data.get("images", {})
+
+    images: Dict[str, Dict] = {}
+    pending: List[str] = []
+    for name in names:
+        stat = (gallery_dir / name).stat()
+        signature = [stat.st_size, stat.st_mtime_ns]
+        known = previous.get(name)
+        if known and known.get("signature") == signature and (zoom_dir / known.get("dzi", "")).exists():
+            images[name] = known
+            continue
+        try:
+            size = read_image_size(gallery_dir / name)
+        except Image.DecompressionBombError:
+            pending.append(name)  # 超出 Pillow 像素上限的巨幅原图正是最需要缩放的
+            continue
+        except (OSError, UnidentifiedImageError) as exc:
+            print(f"⚠️ 无法读取原图，跳过生成瓦片：{name}（{exc}）")
+            continue
+        if max(size) > max(DEFAULT_TARGET_SIZE):
+            pending.append(name)
+
+    if pending:
+        zoom_dir.mkdir(parents=True, exist_ok=True)
+        started = time.perf_counter()
+        built = []
+        with worker_pool(min(resolve_worker_count(workers), len(pending))) as pool:
+            futures = {pool.submit(build_zoom_pyramid, gallery_dir / name, zoom_dir): name for name in pending}
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Tiling originals"):
+                name = futures[future]
+                try:
+                    info = future.result()
+                except Exception as exc:
+                    # 单张失败（含内存不足、worker 被杀）只跳过这一张，zoom.json 照常写出
+                    print(f"⚠️ 生成瓦片失败：{name}（{type(exc).__name__}: {exc}）")
+                    continue
+                stat = (gallery_dir / name).stat()
+                images[name] = {**info, "signature": [stat.st_size, stat.st_mtime_ns]}
+                built.append(info)
+        print(
+            f"深度缩放：{len(built)} 张原图切成 {sum(info['tiles'] for info in built)} 个瓦片，"
+            f"共 {sum(info['bytes'] for info in built) / 1024 / 1024:.1f} MB，耗时 {time.perf_counter() - started:.1f}s"
+        )
+
+    # 原图删除或改名后清掉对应的瓦片
+    live = {Path(info["dzi"]).stem for info in images.values()}
+    if zoom_dir.exists():
+        for stale in zoom_dir.iterdir():
+            stem = stale.name[:-len("_files")] if stale.is_dir() else stale.stem
+            if stale.name == ZOOM_FILENAME or stem in live:
+                continue
+            if stale.is_dir():
+                shutil.rmtree(stale)
+            else:
+                stale.unlink()
+    if not images and not index_path.exists():
+        return None
+    payload = {"version": ZOOM_VERSION, "settings": settings, "images": dict(sorted(images.items()))}
+    atomic_write(index_path, json.dumps(payload, ensure_ascii=False, indent=2))
+    return index_path
+
+
+def build_zoom_pyramid(source: str | os.PathLike, zoom_dir: str | os.PathLike) -> Dict[str, object]:
+    """Tile one original into a DZI pyramid under ``zoom_dir``; returns its size and tile statistics.
+
+    The original is decoded once at full resolution, turned upright and
+    converted to sRGB (tiles carry no ICC profile); each lower level is the
+    previous one halved. Originals beyond Pillow's decompression-bomb limit
+    are tiled too: they are our own photos, and the bigger they are the more
+    the viewer needs tiles. Tiles are written to a staging folder that replaces
+    the old one in a single rename, and the ``.dzi`` descriptor is written
+    last, so an interrupted run never leaves a viewer with missing tiles.
+    """
+    source, zoom_dir = Path(source), Path(zoom_dir)
+    with open_unguarded(source) as img:
+        icc_profile = img.info.get("icc_profile")
+        transpose = ORIENTATION_TRANSPOSE.get(img.getexif().get(EXIF_ORIENTATION))
+        frame = img.convert("RGB")
+    if transpose is not None:
+        frame = frame.transpose(transpose)
+    if ImageCms is not None:
+        frame, _ = convert_to_srgb(frame, icc_profile)
+    width, height = frame.size
+    top_level = math.ceil(math.log2(max(width, height)))
+
+    files_dir = zoom_dir / f"{source.stem}_files"
+    staging = zoom_dir / f".{source.stem}_files.{os.getpid()}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    tiles = total = 0
+    for level in range(top_level, -1, -1):
+        level_dir = staging / str(level)
+        level_dir.mkdir(parents=True)
+        for col in range(math.ceil(frame.width / ZOOM_TILE_SIZE)):
+            for row in range(math.ceil(frame.height / ZOOM_TILE_SIZE)):
+                left = col * ZOOM_TILE_SIZE - (ZOOM_OVERLAP if col else 0)
+                top = row * ZOOM_TILE_SIZE - (ZOOM_OVERLAP if row else 0)
+                right = min(frame.width, (col + 1) * ZOOM_TILE_SIZE + ZOOM_OVERLAP)
+                bottom = min(frame.height, (row + 1) * ZOOM_TILE_SIZE + ZOOM_OVERLAP)
+                buffer = io.BytesIO()
+                frame.crop((left, top, right, bottom)).save(buffer, "JPEG", quality=ZOOM_QUALITY, optimize=True)
+                (level_dir / f"{col}_{row}.jpg").write_bytes(buffer.getvalue())
+                tiles += 1
+                total += buffer.tell()
+        if level:
+            # DZI 每一级是上一级的一半（向上取整），BOX 即 2×2 平均
+            frame = frame.resize((math.ceil(frame.width / 2), math.ceil(frame.height / 2)), Image.Resampling.BOX)
+
+    retired = zoom_dir / f".{source.stem}_files.{os.getpid()}.old"
+    if files_dir.exists():
+        files_dir.rename(retired)
+    staging.rename(files_dir)
+    shutil.rmtree(retired, ignore_errors=True)
+    descriptor = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="jpg" '
+        f'Overlap="{ZOOM_OVERLAP}" TileSize="{ZOOM_TILE_SIZE}">\n'
+        f'  <Size Width="{width}" Height="{height}"/>\n'
+        '</Image>\n'
+    )
+    atomic_write(zoom_dir / f"{source.stem}.dzi", descriptor)
+    return {
+        "dzi": f"{source.stem}.dzi",
+        "width": width,
+        "height": height,
+        "levels": top_level + 1,
+        "tiles": tiles,
+        "bytes": total,
+    }
+
+
+def load_zoom_index(project_dir: str | os.PathLike) -> Dict[str, Dict]:
+    """``{original name: pyramid info}`` from the project's ``zoom.json``; empty when none were built."""
+    index_path = Path(project_dir) / "public" / ZOOM_DIRNAME / ZOOM_FILENAME
+    if not index_path.exists():
+        return {}
+    try:
+        data = json.loads(index_path.read_text(encoding="utf-8"))
+    except (json.JSONDecodeError, OSError):
+        return {}
+    images = data.get("images", {}) if isinstance(data, dict) else {}
+    return images if isinstance(images, dict) else {}
+
+
+def zoom_attr(index: Dict[str, Dict], name: str, url_prefix: str) -> str:
+    """`` data-zoom="…dzi"`` for a gallery ``<img>`` whose original has a tile pyramid, else ``""``."""
+    info = index.get(name)
+    if not info:
+        return ""
+    url = quote(f"{url_prefix}public/{ZOOM_DIRNAME}/{info['dzi']}")
+    return f' data-zoom="{url}"'
+
+
+class ProjectManifest:
+    """Per-project ``manifest.json``: every image with its derivatives and page data.
+
+    Sizes are read from file headers, never from a full decode, so the
+    manifest can be rebuilt for a whole project in well under a second. Each
+    image also carries what its ``<picture>`` needs — placeholder, srcsets,
+    pre-blurred slideshow frame and zoom pyramid, as URLs relative to the
+    project folder — so project pages render from the manifest alone.
+    """
+
+    def __init__(self, project_dir: str | os.PathLike, images: List[Dict] | None = None):
+        self.project_dir = Path(project_dir)
+        self.path = self.project_dir / MANIFEST_FILENAME
+        self.images: List[Dict] = images or []
+        self._index: Dict[str, Dict] = {
+            derivative["path"]: derivative
+            for image in self.images
+            for derivative in image.get("derivatives", [])
+        }
+
+    @classmethod
+    def load(cls, project_dir: str | os.PathLike) -> ProjectManifest:
+        path = Path(project_dir) / MANIFEST_FILENAME
+        images: List[Dict] = []
+        if path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (json.JSONDecodeError, OSError):
+                data = {}
+            if isinstance(data, dict) and data.get("version") == MANIFEST_VERSION:
+                stored = data.get("images", [])
+                if isinstance(stored, list):
+                    images = stored
+        return cls(project_dir, images)
+
+    @classmethod
+    def build(cls, project_dir: str | os.PathLike, cache: BuildCache | None = None) -> ProjectManifest:
+        """Scan ``public/background`` plus every derivative the cache knows about."""
+        project_dir = Path(project_dir)
+        background_dir = project_dir / "public" / "background"
+        cache = cache or BuildCache.load(project_dir)
+        zoom = load_zoom_index(project_dir)
+        images: List[Dict] = []
+        for name in list_images(background_dir, BACKGROUND_EXTENSIONS) if background_dir.exists() else []:
+            background = background_dir / name
+            paths = [background]
+            entry = cache.entries.get(cache.key_for(background), {})
+            for output in entry.get("outputs", []):
+                path = project_dir / output["path"]
+                if path != background and path.exists():
+                    paths.append(path)
+            derivatives = []
+            for path in paths:
+                try:
+                    width, height = read_image_size(path)
+                except (OSError, UnidentifiedImageError):
+                    continue
+                derivatives.append({
+                    "path": Path(os.path.relpath(path, project_dir)).as_posix(),
+                    "width": width,
+                    "height": height,
+                    "bytes": path.stat().st_size,
+                    "aspect_ratio": round(width / height, 4),
+                })
+            if not derivatives:
+                continue
+            image: Dict[str, object] = {"name": name, "derivatives": derivatives}
+            if entry.get("placeholder"):
+                image["placeholder"] = entry["placeholder"]
+            srcsets = cache.srcsets(background, "./")
+            if srcsets:
+                image["srcset"] = srcsets
+            slideshow = cache.slideshow_url(background, "./")
+            if slideshow:
+                image["slideshow"] = slideshow
+            if name in zoom:
+                image["zoom"] = quote(f"./public/{ZOOM_DIRNAME}/{zoom[name]['dzi']}")
+            images.append(image)
+        return cls(project_dir, images)
+
+    def save(self) -> None:
+        payload = {
+            "version": MANIFEST_VERSION,
+            "project": self.project_dir.name,
+            "images": self.images,
+        }
+        atomic_write(self.path, json.dumps(payload, ensure_ascii=False, indent=2))
+
+    def size(self, path: str | os.PathLike) -> Tuple[int, int] | None:
+        derivative = self._index.get(Path(os.path.relpath(path, self.project_dir)).as_posix())
+        if not derivative:
+            return None
+        return derivative["width"], derivative["height"]
+
+    def size_attrs(self, path: str | os.PathLike) -> str:
+        """`` width="…" height="…"`` for an ``<img>`` so the browser reserves its box before it loads."""
+        size = self.size(path)
+        if not size:
+            return ""
+        return f' width="{size[0]}" height="{size[1]}"'
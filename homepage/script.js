@@ -288,6 +288,11 @@ function initContent() {
         }, 150 + index * 80); // 每个元素延迟 80ms
     });
     
+    // 画廊卡片悬停预览：读取项目的 contact.json，在同一张雪碧图上逐格切换
+    if (window.matchMedia('(hover: hover)').matches) {
+        document.querySelectorAll('.gallery-item[data-link]').forEach(initContactPreview);
+    }
+
     // 为日志条目添加逐个浮现动画
     document.querySelectorAll('.journal-entry').forEach((item, index) => {
         setTimeout(() => {
@@ -346,6 +351,58 @@ function initContent() {
     });
 }
 
+const supportsWebp = document.createElement('canvas').toDataURL('image/webp').startsWith('data:image/webp');
+
+function initContactPreview(item) {
+    const link = item.getAttribute('data-link');
+    const image = item.querySelector('.update-image');
+    if (!link || !image) return;
+    const projectDir = link.slice(0, link.lastIndexOf('/') + 1);
+    let contact = null; // null 表示尚未加载，false 表示该项目没有雪碧图
+    let preview = null;
+    let timer = null;
+    let frame = 0;
+
+    const showFrame = () => {
+        const entry = contact.images[frame % contact.images.length];
+        const sheet = contact.sheets[entry.sheet];
+        const file = supportsWebp && sheet.webp ? sheet.webp : sheet.jpeg;
+        const [cellWidth, cellHeight] = contact.cell;
+        const spanX = sheet.width - cellWidth;
+        const spanY = sheet.height - cellHeight;
+        preview.style.backgroundImage = `url('${projectDir}public/contact/${file}')`;
+        preview.style.backgroundSize = `${sheet.width / cellWidth * 100}% ${sheet.height / cellHeight * 100}%`;
+        preview.style.backgroundPosition = `${spanX ? entry.x / spanX * 100 : 0}% ${spanY ? entry.y / spanY * 100 : 0}%`;
+        frame += 1;
+    };
+
+    item.addEventListener('mouseenter', async () => {
+        if (contact === null) {
+            try {
+                const response = await fetch(`${projectDir}public/contact/contact.json`);
+                contact = response.ok ? await response.json() : false;
+            } catch (error) {
+                contact = false;
+            }
+        }
+        if (!contact || !contact.images.length || !item.matches(':hover')) return;
+        if (!preview) {
+            preview = document.createElement('div');
+            preview.className = 'contact-preview';
+            image.appendChild(preview);
+        }
+        showFrame();
+        preview.classList.add('active');
+        clearInterval(timer);
+        timer = setInterval(showFrame, 700);
+    });
+
+    item.addEventListener('mouseleave', () => {
+        clearInterval(timer);
+        if (preview) preview.classList.remove('active');
+    });
+}
+
 document.addEventListener("DOMContentLoaded", function() {
     setTimeout(startSlideshow, 500);
     
@@ -0,0 +1,495 @@
+from __future__ import annotations
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from gallery_utils import (
+    BACKGROUND_EXTENSIONS,
+    IMAGE_EXTENSIONS,
+    BuildCache,
+    Stage,
+    StageContext,
+    hash_file,
+    list_images,
+    resolve_worker_count,
+)
+
+HASH_SIZE = 8
+PHASH_SCALE = 4
+HASH_DECODE_SIZE = 64
+DUPLICATE_THRESHOLD = 10
+SSIM_WINDOW = 11
+SSIM_SIGMA = 1.5
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+SCORE_SIZE = 512
+SCORE_VERSION = 1
+# 亮度不高于/不低于此值的像素视为死黑/过曝
+CLIP_LOW = 2
+CLIP_HIGH = 253
+# 清晰度低于项目中位数的这个比例，或低于绝对下限，就标记为模糊
+BLUR_RELATIVE = 0.25
+BLUR_ABSOLUTE = 20.0
+# 封面排序时各指标（项目内的百分位）的权重
+COVER_WEIGHTS = {"sharpness": 0.45, "contrast": 0.25, "exposure": 0.2, "noise": 0.1}
+SALIENCY_SIZE = 160
+# 居中先验的强度：能量相近时偏向画面中央，避免裁到边缘的纹理上
+SALIENCY_CENTER_BIAS = 0.15
+# Wang et al. 2003 的五个尺度权重，从最细到最粗
+MS_SSIM_WEIGHTS = (0.0448, 0.2856, 0.3001, 0.2363, 0.1333)
+
+
+@dataclass
+class ArchiveImage:
+    project: str
+    path: Path
+    width: int
+    height: int
+    phash: int
+    dhash: int
+    cost: int  # background + 响应式变体 + gallery 原图的总字节数
+
+    @property
+    def label(self) -> str:
+        return f"{self.project}/{self.path.name}"
+
+
+@dataclass
+class ImageScore:
+    name: str
+    sharpness: float  # 拉普拉斯方差
+    shadows: float  # 死黑像素比例
+    highlights: float  # 过曝像素比例
+    brightness: float
+    contrast: float  # 亮度标准差
+    noise: float  # 噪声标准差估计
+    cover: float = 0.0
+    blurry: bool = False
+
+    @property
+    def clipped(self) -> float:
+        return self.shadows + self.highlights
+
+
+@dataclass
+class DuplicateGroup:
+    keeper: ArchiveImage
+    duplicates: List[ArchiveImage]
+
+    @property
+    def wasted_bytes(self) -> int:
+        return sum(image.cost for image in self.duplicates)
+
+
+class BKTree:
+    """Burkhard–Keller tree over 64-bit hashes with Hamming distance.
+
+    A radius query only descends into children whose edge distance lies in
+    ``[d - radius, d + radius]``, which prunes most of the archive for small
+    radii instead of comparing every pair.
+    """
+
+    def __init__(self):
+        self._root: Tuple[int, object, Dict[int, Tuple]] | None = None
+
+    def add(self, value: int, item: object) -> None:
+        if self._root is None:
+            self._root = (value, item, {})
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, item, {})
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> Iterator[Tuple[int, object]]:
+        if self._root is None:
+            return
+        stack = [self._root]
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                yield distance, item
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+
+
+def hamming(first: int, second: int) -> int:
+    return bin(first ^ second).count("1")
+
+
+def dhash(img: Image.Image) -> int:
+    """Difference hash: sign of horizontal gradients on a 9×8 greyscale thumbnail."""
+    gray = img.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.int16)
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(img: Image.Image) -> int:
+    """DCT hash: low-frequency 8×8 coefficients of a 32×32 thumbnail against their median."""
+    size = HASH_SIZE * PHASH_SCALE
+    gray = img.convert("L").resize((size, size), Image.Resampling.LANCZOS)
+    matrix = _dct_matrix(size)
+    coefficients = matrix @ np.asarray(gray, dtype=np.float64) @ matrix.T
+    low = coefficients[:HASH_SIZE, :HASH_SIZE].flatten()
+    # 直流分量只反映整体亮度，不参与中位数
+    return _pack_bits(low > np.median(low[1:]))
+
+
+def ssim(reference: Image.Image, candidate: Image.Image) -> float:
+    """Mean structural similarity of the luma channels, with an 11-tap Gaussian window."""
+    return _ssim_terms(_luma(reference), _luma(candidate))[0]
+
+
+def ms_ssim(reference: Image.Image, candidate: Image.Image) -> float:
+    """Multi-scale SSIM: contrast/structure at each 2× downscale, luminance only at the coarsest.
+
+    Small frames use fewer scales (the window must still fit), with the
+    remaining weights renormalised so scores stay comparable.
+    """
+    x, y = _luma(reference), _luma(candidate)
+    scales = 1
+    while scales < len(MS_SSIM_WEIGHTS) and min(x.shape) >> scales >= SSIM_WINDOW:
+        scales += 1
+    weights = np.array(MS_SSIM_WEIGHTS[:scales]) / sum(MS_SSIM_WEIGHTS[:scales])
+    score = 1.0
+    for index, weight in enumerate(weights):
+        full, contrast = _ssim_terms(x, y)
+        if index == scales - 1:
+            score *= max(full, 0.0) ** weight
+        else:
+            score *= max(contrast, 0.0) ** weight
+            x, y = _downsample(x), _downsample(y)
+    return float(score)
+
+
+def saliency_crop_box(img: Image.Image, aspect: float) -> Tuple[int, int, int, int]:
+    """The ``aspect``-ratio crop of ``img`` (full width or full height) holding the most edge energy.
+
+    Gradient magnitude on a small greyscale copy serves as the saliency map;
+    the window position is found from 1-D cumulative sums along the axis
+    being cropped, with a mild centre prior so flat frames stay centred.
+    """
+    width, height = img.size
+    if abs(width / height - aspect) < 1e-3:
+        return 0, 0, width, height
+    small = img.convert("L")
+    small.thumbnail((SALIENCY_SIZE, SALIENCY_SIZE), Image.Resampling.BOX)
+    gray = np.asarray(small, dtype=np.float32)
+    energy = np.zeros_like(gray)
+    energy[:, 1:] += np.abs(np.diff(gray, axis=1))
+    energy[1:, :] += np.abs(np.diff(gray, axis=0))
+
+    horizontal = width / height > aspect
+    profile = energy.sum(axis=0 if horizontal else 1)
+    full = width if horizontal else height
+    crop = round(height * aspect) if horizontal else round(width / aspect)
+    window = max(1, round(len(profile) * crop / full))
+    sums = np.concatenate(([0.0], np.cumsum(profile)))
+    scores = sums[window:] - sums[:-window]
+    if scores.max() > 0:
+        offsets = np.arange(len(scores)) - (len(scores) - 1) / 2
+        prior = 1 - SALIENCY_CENTER_BIAS * np.abs(offsets) / max(1.0, (len(scores) - 1) / 2)
+        start = int(np.argmax(scores * prior))
+    else:
+        start = (len(scores) - 1) // 2
+    origin = min(round(start * full / len(profile)), full - crop)
+    if horizontal:
+        return origin, 0, origin + crop, height
+    return 0, origin, width, origin + crop
+
+
+def score_image(path: str | Path) -> Dict[str, float]:
+    """Sharpness, exposure clipping, contrast and noise of one photo, on a greyscale copy about 512px wide.
+
+    Sharpness is the variance of the 4-neighbour Laplacian; noise uses
+    Immerkær's estimator (mean absolute response of a Laplacian-difference
+    kernel that cancels image structure up to second order).
+    """
+    with Image.open(path) as img:
+        img.draft("L", (SCORE_SIZE, SCORE_SIZE))
+        gray = img.convert("L")
+    return {"version": SCORE_VERSION, **score_frame(gray)}
+
+
+def score_frame(img: Image.Image) -> Dict[str, float]:
+    """The measurements of :func:`score_image` on an already decoded frame."""
+    gray = img.convert("L")
+    gray.thumbnail((SCORE_SIZE, SCORE_SIZE), Image.Resampling.BOX)
+    pixels = np.asarray(gray, dtype=np.float32)
+    centre = pixels[1:-1, 1:-1]
+    laplacian = pixels[:-2, 1:-1] + pixels[2:, 1:-1] + pixels[1:-1, :-2] + pixels[1:-1, 2:] - 4 * centre
+    diagonal = pixels[:-2, :-2] + pixels[:-2, 2:] + pixels[2:, :-2] + pixels[2:, 2:]
+    # 核 [[1,-2,1],[-2,4,-2],[1,-2,1]] = 对角和 - 2·(四邻和 - 4·中心) - 4·中心
+    noise_response = diagonal - 2 * laplacian - 4 * centre
+    return {
+        "sharpness": round(float(laplacian.var()), 3),
+        "shadows": round(float((pixels <= CLIP_LOW).mean()), 5),
+        "highlights": round(float((pixels >= CLIP_HIGH).mean()), 5),
+        "brightness": round(float(pixels.mean()), 3),
+        "contrast": round(float(pixels.std()), 3),
+        "noise": round(float(np.abs(noise_response).mean() * math.sqrt(math.pi / 2) / 6), 4),
+    }
+
+
+def score_project(project_dir: Path, workers: int | None = None) -> List[ImageScore]:
+    """Score every gallery photo of a project, best cover first, reusing scores cached by content hash.
+
+    Originals in ``public/gallery`` are scored when present, otherwise the
+    ``background`` derivatives.
+    """
+    folder, extensions = project_dir / "public" / "gallery", IMAGE_EXTENSIONS
+    if not folder.is_dir() or not list_images(folder):
+        folder, extensions = project_dir / "public" / "background", BACKGROUND_EXTENSIONS
+    cache = BuildCache.load(project_dir)
+    names = list_images(folder, extensions)
+    by_source = {entry.get("source"): entry for entry in cache.entries.values()}
+    hashes = [_content_hash(by_source, project_dir, folder / name) for name in names]
+    # 压缩时 scores 阶段已在同一次解码上算过的分数
+    staged = {
+        entry["sha256"]: entry["stages"][SCORE_STAGE.name]
+        for entry in cache.entries.values()
+        if entry.get("stages", {}).get(SCORE_STAGE.name, {}).get("version") == SCORE_VERSION
+    }
+    found = {sha: staged[sha] for sha in hashes if sha in staged}
+    found.update(
+        (sha, cache.scores[sha]) for sha in hashes if cache.scores.get(sha, {}).get("version") == SCORE_VERSION
+    )
+    missing = [(name, sha) for name, sha in zip(names, hashes) if sha not in found]
+    if missing:
+        with ThreadPoolExecutor(max_workers=resolve_worker_count(workers)) as pool:
+            scored = pool.map(score_image, [folder / name for name, _ in missing])
+            for (_, sha), values in zip(missing, scored):
+                found[sha] = values
+                cache.store_scores(sha, values)
+        # 只有已构建（缓存中有条目）的图片的分数会被保存
+        cache.save()
+    scores = []
+    for name, sha in zip(names, hashes):
+        values = {key: value for key, value in found[sha].items() if key != "version"}
+        scores.append(ImageScore(name=name, **values))
+    return rank_covers(scores)
+
+
+def rank_covers(scores: List[ImageScore]) -> List[ImageScore]:
+    """Fill in ``cover`` and ``blurry`` and sort best cover first.
+
+    Each metric becomes a percentile within the project, so the ranking
+    adapts to a project's overall look (a night series is not penalised for
+    being dark); blurry frames always sort after sharp ones.
+    """
+    if not scores:
+        return scores
+    ranks = {
+        "sharpness": _percentiles([score.sharpness for score in scores]),
+        "contrast": _percentiles([score.contrast for score in scores]),
+        "exposure": _percentiles([-score.clipped for score in scores]),
+        "noise": _percentiles([-score.noise for score in scores]),
+    }
+    median_sharpness = float(np.median([score.sharpness for score in scores]))
+    for index, score in enumerate(scores):
+        score.cover = round(float(sum(weight * ranks[metric][index] for metric, weight in COVER_WEIGHTS.items())), 4)
+        score.blurry = bool(score.sharpness < max(BLUR_ABSOLUTE, BLUR_RELATIVE * median_sharpness))
+    return sorted(scores, key=lambda score: (score.blurry, -score.cover, score.name))
+
+
+def hash_image(path: str | Path) -> Dict[str, object]:
+    """Perceptual hashes plus pixel size of one file, decoding JPEGs at reduced scale."""
+    with Image.open(path) as img:
+        width, height = img.size
+        img.draft("L", (HASH_DECODE_SIZE, HASH_DECODE_SIZE))
+        frame = img.convert("L")
+    return {"phash": f"{phash(frame):016x}", "dhash": f"{dhash(frame):016x}", "width": width, "height": height}
+
+
+def _hash_stage(ctx: StageContext) -> Dict[str, object]:
+    # 帧就是 background 图的像素，哈希与之后读取 background 文件算出的一致（至多差 JPEG 噪声）
+    frame = ctx.frame.convert("L")
+    width, height = ctx.frame.size
+    return {"phash": f"{phash(frame):016x}", "dhash": f"{dhash(frame):016x}", "width": width, "height": height}
+
+
+def _score_stage(ctx: StageContext) -> Dict[str, float]:
+    return score_frame(ctx.frame)
+
+
+# 压缩时顺带运行的分析阶段：查找重复照片与封面推荐不必再解码一次
+HASH_STAGE = Stage("hashes", _hash_stage)
+SCORE_STAGE = Stage("scores", _score_stage, version=SCORE_VERSION)
+ANALYSIS_STAGES = (HASH_STAGE, SCORE_STAGE)
+
+
+def scan_archive(root: Path, workers: int | None = None) -> List[ArchiveImage]:
+    """Hash every background image under ``root/project``, reusing hashes stored in each build cache."""
+    images: List[ArchiveImage] = []
+    with ThreadPoolExecutor(max_workers=resolve_worker_count(workers)) as pool:
+        for project_dir in sorted((root / "project").iterdir()):
+            background = project_dir / "public" / "background"
+            if not background.is_dir():
+                continue
+            cache = BuildCache.load(project_dir)
+            paths = [background / name for name in list_images(background, BACKGROUND_EXTENSIONS)]
+            missing = []
+            for path in paths:
+                if "phash" in (cache.analysis_for(path) or {}):
+                    continue
+                staged = cache.entries.get(cache.key_for(path), {}).get("stages", {}).get(HASH_STAGE.name)
+                if staged:
+                    cache.store_analysis(path, {key: value for key, value in staged.items() if key != "version"})
+                else:
+                    missing.append(path)
+            for path, values in zip(missing, pool.map(hash_image, missing)):
+                cache.store_analysis(path, values)
+            cache.save()
+            for path in paths:
+                values = cache.analysis_for(path)
+                images.append(
+                    ArchiveImage(
+                        project=project_dir.name,
+                        path=path,
+                        width=values["width"],
+                        height=values["height"],
+                        phash=int(values["phash"], 16),
+                        dhash=int(values["dhash"], 16),
+                        cost=_shipped_bytes(project_dir, cache, path),
+                    )
+                )
+    return images
+
+
+def find_duplicate_groups(
+    images: Iterable[ArchiveImage],
+    threshold: int = DUPLICATE_THRESHOLD,
+) -> List[DuplicateGroup]:
+    """Group images whose pHash and dHash both lie within ``threshold`` bits, most wasteful first.
+
+    Candidates come from a BK-tree radius query on the pHash; the dHash
+    confirms them, and pairs are merged transitively. The highest-resolution
+    image of each group is treated as the one to keep.
+    """
+    images = list(images)
+    tree = BKTree()
+    for index, image in enumerate(images):
+        tree.add(image.phash, index)
+
+    parent = list(range(len(images)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    for index, image in enumerate(images):
+        for _, other in tree.search(image.phash, threshold):
+            if other != index and hamming(image.dhash, images[other].dhash) <= threshold:
+                parent[find(other)] = find(index)
+
+    members: Dict[int, List[ArchiveImage]] = {}
+    for index, image in enumerate(images):
+        members.setdefault(find(index), []).append(image)
+
+    groups = []
+    for group in members.values():
+        if len(group) < 2:
+            continue
+        group.sort(key=lambda image: (-image.width * image.height, -image.cost, image.label))
+        groups.append(DuplicateGroup(keeper=group[0], duplicates=group[1:]))
+    groups.sort(key=lambda group: group.wasted_bytes, reverse=True)
+    return groups
+
+
+def _content_hash(by_source: Dict[str, Dict], project_dir: Path, path: Path) -> str:
+    # 构建缓存里已有该源文件的哈希且文件没变时直接用，免得重新读取整个文件
+    entry = by_source.get(path.relative_to(project_dir).as_posix())
+    stat = path.stat()
+    if entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+        return entry["sha256"]
+    return hash_file(path)
+
+
+def _percentiles(values: List[float]) -> np.ndarray:
+    # 相同的值取平均名次
+    values = np.asarray(values, dtype=np.float64)
+    ordered = np.sort(values)
+    below = np.searchsorted(ordered, values, side="left")
+    through = np.searchsorted(ordered, values, side="right")
+    return (below + through - 1) / 2 / max(1, len(values) - 1)
+
+
+def _shipped_bytes(project_dir: Path, cache: BuildCache, background: Path) -> int:
+    total = background.stat().st_size
+    entry = cache.entries.get(cache.key_for(background), {})
+    for output in entry.get("outputs", []):
+        path = project_dir / output["path"]
+        if path != background and path.exists():
+            total += path.stat().st_size
+    original = project_dir / "public" / "gallery" / background.name
+    if original.exists():
+        total += original.stat().st_size
+    return total
+
+
+def _luma(img: Image.Image) -> np.ndarray:
+    # float32 足够：方差的相对误差远小于 C2
+    return np.asarray(img.convert("L"), dtype=np.float32)
+
+
+def _ssim_terms(x: np.ndarray, y: np.ndarray) -> Tuple[float, float]:
+    """Mean SSIM and mean contrast-structure term over all valid window positions."""
+    if x.shape != y.shape:
+        raise ValueError(f"SSIM needs equal sizes, got {x.shape} and {y.shape}")
+    mu_x, mu_y = _gaussian_filter(x), _gaussian_filter(y)
+    var_x = _gaussian_filter(x * x) - mu_x * mu_x
+    var_y = _gaussian_filter(y * y) - mu_y * mu_y
+    covariance = _gaussian_filter(x * y) - mu_x * mu_y
+    contrast = (2 * covariance + SSIM_C2) / (var_x + var_y + SSIM_C2)
+    luminance = (2 * mu_x * mu_y + SSIM_C1) / (mu_x * mu_x + mu_y * mu_y + SSIM_C1)
+    return float((luminance * contrast).mean()), float(contrast.mean())
+
+
+def _gaussian_filter(values: np.ndarray) -> np.ndarray:
+    """Separable Gaussian blur over the 'valid' region, as shifted-slice sums instead of a per-pixel loop."""
+    kernel = _gaussian_kernel()
+    size = len(kernel)
+    height, width = values.shape
+    rows = sum(weight * values[offset:height - size + 1 + offset] for offset, weight in enumerate(kernel))
+    return sum(weight * rows[:, offset:width - size + 1 + offset] for offset, weight in enumerate(kernel))
+
+
+def _downsample(values: np.ndarray) -> np.ndarray:
+    height, width = values.shape[0] // 2 * 2, values.shape[1] // 2 * 2
+    values = values[:height, :width]
+    return (values[0::2, 0::2] + values[1::2, 0::2] + values[0::2, 1::2] + values[1::2, 1::2]) / 4
+
+
+@lru_cache(maxsize=None)
+def _gaussian_kernel() -> Tuple[float, ...]:
+    offsets = np.arange(SSIM_WINDOW) - SSIM_WINDOW // 2
+    kernel = np.exp(-(offsets ** 2) / (2 * SSIM_SIGMA ** 2))
+    return tuple(np.float32(value) for value in kernel / kernel.sum())
+
+
+@lru_cache(maxsize=None)
+def _dct_matrix(size: int) -> np.ndarray:
+    rows = np.arange(size)[:, None]
+    cols = np.arange(size)[None, :]
+    matrix = np.cos(math.pi * (2 * cols + 1) * rows / (2 * size)) * math.sqrt(2 / size)
+    matrix[0] /= math.sqrt(2)
+    return matrix
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), "big")
@@ -12,6 +12,10 @@ from pathlib import Path
 from typing import Dict, List, Tuple
 from urllib.parse import urlparse, unquote
 
+from PIL import Image, UnidentifiedImageError
+
+from gallery_utils import COVER_DIRNAME, build_cover_thumbnails, cover_picture
+
 IMAGE_TOKEN_PATTERN = re.compile(r'!\[[^\]]*\]\(([^)]+)\)|!\[\[([^\]]+)\]\]')
 BANNER_PATTERN = re.compile(r'^\s*banner::\s*(.+)$', re.IGNORECASE | re.MULTILINE)
 ICON_PATTERN = re.compile(r'^\s*icon::\s*(.+)$', re.IGNORECASE | re.MULTILINE)
@@ -42,6 +46,8 @@ class JournalBuildResult:
     md_filename: str
     image_map: Dict[str, str]
     warnings: List[str]
+    hero_size: Tuple[int, int] | None = None
+    hero_covers: List[Dict[str, object]] | None = None
 
 
 def normalize_input_path(raw_path: str) -> Path:
@@ -134,6 +140,8 @@ def prepare_journal_entry(
     hero_entry_src, hero_homepage_src = _compute_hero_sources(
         entry_name, hero_candidate
     )
+    hero_size = _read_hero_size(hero_candidate, temp_assets, journals_root)
+    hero_covers = _build_hero_covers(hero_candidate, temp_assets, entry_dir / COVER_DIRNAME, warnings)
 
     timestamp = datetime.now().astimezone().strftime("%Y-%m-%d %H:%M:%S")
     link_href = f"../journals/{entry_name}/{entry_name}.html"
@@ -156,6 +164,8 @@ def prepare_journal_entry(
         md_filename=md_destination.name,
         image_map=image_map,
         warnings=warnings,
+        hero_size=hero_size,
+        hero_covers=hero_covers,
     )
     _write_entry_html(result)
     _write_meta_file(result)
@@ -168,11 +178,18 @@ def prepare_journal_entry(
 def format_update_block(ctx: JournalBuildResult) -> str:
     safe_title = html.escape(ctx.title)
     safe_summary = html.escape(ctx.summary)
+    size_attrs = _size_attrs(ctx.hero_size)
+    hero_img = f'<img class="lazy" data-src="{ctx.hero_homepage_src}"{size_attrs} alt="{safe_title} 封面">'
+    if ctx.hero_covers:
+        # 卡片比例的 1x/2x 封面，不必下载原始大图
+        hero_img = cover_picture(
+            ctx.hero_covers, f"../journals/{ctx.entry_name}/{COVER_DIRNAME}/", f'alt="{safe_title} 封面"'
+        )
     block = f"""
     <div class="update-item">
         <div class="update-image">
             <a href="{ctx.link_href}">
-                <img class="lazy" data-src="{ctx.hero_homepage_src}" alt="{safe_title} 封面">
+                {hero_img}
                 <div class="image-title"></div>
             </a>
         </div>
@@ -439,6 +456,44 @@ def _compute_hero_sources(entry_name: str, hero_source: str | None) -> Tuple[str
     return (hero_source, hero_source)
 
 
+def _read_hero_size(
+    hero_source: str | None, assets_dir: Path, journals_root: Path
+) -> Tuple[int, int] | None:
+    if not hero_source:
+        path = journals_root / "default.jpeg"
+    elif hero_source.startswith("./assets/"):
+        path = assets_dir / hero_source[len("./assets/"):]
+    else:
+        return None
+    try:
+        with Image.open(path) as img:  # 只读取文件头，不解码像素
+            return img.size
+    except (OSError, UnidentifiedImageError):
+        return None
+
+
+def _build_hero_covers(
+    hero_source: str | None, assets_dir: Path, cover_dir: Path, warnings: List[str]
+) -> List[Dict[str, object]] | None:
+    if cover_dir.exists():
+        shutil.rmtree(cover_dir)  # 每篇日志只有一张封面，换封面后旧文件不再引用
+    if not hero_source or not hero_source.startswith("./assets/"):
+        return None
+    try:
+        return build_cover_thumbnails(assets_dir / hero_source[len("./assets/"):], cover_dir)
+    except (ImportError, OSError, ValueError, Image.DecompressionBombError) as exc:
+        # 超大、损坏或模式不支持的图片退回到未裁剪的封面原图
+        shutil.rmtree(cover_dir, ignore_errors=True)
+        warnings.append(f"无法生成封面缩略图：{exc}")
+        return None
+
+
+def _size_attrs(size: Tuple[int, int] | None) -> str:
+    if not size:
+        return ""
+    return f' width="{size[0]}" height="{size[1]}"'
+
+
 def _extract_summary(text: str) -> str:
     paragraphs: List[str] = []
     current: List[str] = []
@@ -532,6 +587,7 @@ def _write_entry_html(ctx: JournalBuildResult) -> None:
     icon = html.escape(ctx.icon) if ctx.icon else "📓"
     safe_title = html.escape(ctx.title)
     hero_src = html.escape(ctx.hero_entry_src)
+    hero_size = _size_attrs(ctx.hero_size)
     summary_meta = html.escape(ctx.summary)
     image_map_json = json.dumps(ctx.image_map, ensure_ascii=False, indent=2)
     template = f"""<!DOCTYPE html>
@@ -632,6 +688,7 @@ def _write_entry_html(ctx: JournalBuildResult) -> None:
         }}
         .hero img {{
             width: 100%;
+            height: auto;
             border-radius: 18px;
             display: block;
             object-fit: cover;
@@ -751,7 +808,7 @@ def _write_entry_html(ctx: JournalBuildResult) -> None:
             <p class="meta">最后更新：{ctx.timestamp}</p>
         </header>
         <section class="hero">
-            <img src="{hero_src}" alt="{safe_title} hero" loading="lazy" decoding="async">
+            <img src="{hero_src}"{hero_size} alt="{safe_title} hero" loading="lazy" decoding="async">
         </section>
         <main id="journal-body" class="markdown-body"></main>
     </div>
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import html
+import os
+import re
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from gallery_utils import GALLERY_SIZES, ProjectManifest, atomic_write, render_picture
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
+PROJECT_TEMPLATE = TEMPLATE_DIR / "project_index.html"
+SLOT_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+@dataclass(frozen=True)
+class PageTemplate:
+    """A template split once into static text and ``{{ slot }}`` names.
+
+    Rendering only joins strings, so no parsing or regex work happens per
+    page; slots may appear more than once.
+    """
+
+    parts: Tuple[str, ...]  # 偶数位是原样输出的文本，奇数位是插槽名
+    slots: frozenset
+
+    def render(self, **values: str) -> str:
+        missing = self.slots - set(values)
+        if missing:
+            raise ValueError(f"模板缺少插槽的值：{'、'.join(sorted(missing))}")
+        return "".join(part if index % 2 == 0 else values[part] for index, part in enumerate(self.parts))
+
+
+def load_template(path: str | os.PathLike = PROJECT_TEMPLATE) -> PageTemplate:
+    """The compiled template at ``path``, recompiled only when the file changes."""
+    return _compile_template(str(path), os.stat(path).st_mtime_ns)
+
+
+@lru_cache(maxsize=8)
+def _compile_template(path: str, mtime_ns: int) -> PageTemplate:
+    parts = tuple(SLOT_PATTERN.split(Path(path).read_text(encoding="utf-8")))
+    return PageTemplate(parts=parts, slots=frozenset(parts[1::2]))
+
+
+PAGE_SUFFIX = "_index.html"
+
+
+def project_page_path(project_dir: str | os.PathLike) -> Path:
+    """``<folder>_index.html``, or the folder's only existing ``*_index.html``.
+
+    Some folders were renamed after their page was created (the homepage
+    links to the page by its old name), so an existing page wins.
+    """
+    project_dir = Path(project_dir)
+    default = project_dir / f"{project_dir.name}{PAGE_SUFFIX}"
+    if default.exists():
+        return default
+    existing = sorted(project_dir.glob(f"*{PAGE_SUFFIX}"))
+    return existing[0] if len(existing) == 1 else default
+
+
+def render_project_page(project_dir: str | os.PathLike, manifest: ProjectManifest | None = None) -> str:
+    """The project page for ``project_dir``, from its manifest and the compiled template.
+
+    Every image appears once, in the gallery; the page script builds the
+    background slideshow from the gallery's ``data-blur`` frames.
+    """
+    project_dir = Path(project_dir)
+    manifest = manifest or load_page_manifest(project_dir)
+    items = [_gallery_item(manifest, index, image) for index, image in enumerate(manifest.images)]
+    title = project_page_path(project_dir).name[:-len(PAGE_SUFFIX)]
+    return load_template().render(title=html.escape(title), gallery="\n".join(items))
+
+
+def write_project_page(project_dir: str | os.PathLike, manifest: ProjectManifest | None = None) -> Path:
+    path = project_page_path(project_dir)
+    atomic_write(path, render_project_page(project_dir, manifest))
+    return path
+
+
+def write_all_pages(root: str | os.PathLike) -> List[Path]:
+    """Re-render every existing project page under ``root/project``; returns the pages written.
+
+    Projects without a page are reported, not given a new one: the homepage
+    only links pages that 新增图库 created.
+    """
+    started = time.perf_counter()
+    written: List[Path] = []
+    missing: List[str] = []
+    for project_dir in sorted(Path(root, "project").iterdir()):
+        if not (project_dir / "public" / "background").is_dir():
+            continue
+        if not project_page_path(project_dir).exists():
+            missing.append(project_dir.name)
+            continue
+        written.append(write_project_page(project_dir))
+    print(f"✅ 已重新生成 {len(written)} 个项目页，耗时 {(time.perf_counter() - started) * 1000:.0f} ms")
+    if missing:
+        print(f"⚠️ {len(missing)} 个项目没有对应的项目页，已跳过：{'、'.join(missing)}")
+    return written
+
+
+def load_page_manifest(project_dir: Path) -> ProjectManifest:
+    # 没有 manifest 或是旧版本（缺少页面数据）时按构建缓存与文件头重建
+    manifest = ProjectManifest.load(project_dir)
+    if not manifest.images:
+        manifest = ProjectManifest.build(project_dir)
+        manifest.save()
+    return manifest
+
+
+def _gallery_item(manifest: ProjectManifest, index: int, image: Dict) -> str:
+    name = image["name"]
+    attrs = f'class="lazy" data-src="./public/background/{name}"'
+    placeholder = image.get("placeholder")
+    if placeholder:
+        # 低清占位图作为初始 src，懒加载时换成 data-src
+        attrs += f' src="{placeholder["data_uri"]}" style="background-color: {placeholder["color"]}"'
+    attrs += manifest.size_attrs(manifest.project_dir / "public" / "background" / name)
+    if image.get("slideshow"):
+        attrs += f' data-blur="{image["slideshow"]}"'
+    if image.get("zoom"):
+        attrs += f' data-zoom="{image["zoom"]}"'
+    attrs += f' alt="背景图片{index + 1}"'
+    return f"  {render_picture(attrs, image.get('srcset', {}), GALLERY_SIZES)}"
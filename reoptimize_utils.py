@@ -0,0 +1,303 @@
+from __future__ import annotations
+
+import io
+import os
+import re
+from concurrent.futures import as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+from urllib.parse import quote, unquote
+
+from PIL import Image, UnidentifiedImageError
+from tqdm import tqdm
+
+from gallery_utils import (
+    BACKGROUND_EXTENSIONS,
+    EXIF_ORIENTATION,
+    FORMAT_EXTENSIONS,
+    MODERN_FORMATS,
+    ORIENTATION_TRANSPOSE,
+    EncoderProfile,
+    ProjectManifest,
+    QualityTarget,
+    atomic_write,
+    derivative_ssim,
+    list_images,
+    resolve_encoder_profile,
+    resolve_worker_count,
+    search_quality,
+    worker_pool,
+)
+
+# 参照物是已经压缩过一次的 background 图而不是原图，门槛比构建时的 SSIM_WARNING 更严
+REOPTIMIZE_MIN_SSIM = 0.98
+REOPTIMIZE_FORMATS = ("JPEG", "WEBP", "AVIF")
+
+
+@dataclass
+class ReoptimizeResult:
+    path: Path
+    target: Path  # 改格式时是新文件名，否则与 path 相同
+    before: int
+    after: int  # 未采用时等于 before
+    status: str  # accepted / larger / below-ssim / failed
+    quality: int | None = None
+    ssim: float | None = None
+    error: str | None = None
+
+    @property
+    def accepted(self) -> bool:
+        return self.status == "accepted"
+
+
+@dataclass
+class ProjectReport:
+    project: str
+    results: List[ReoptimizeResult] = field(default_factory=list)
+    html_files: int = 0  # 改写了引用的 HTML 文件数
+
+    @property
+    def before(self) -> int:
+        return sum(result.before for result in self.results)
+
+    @property
+    def after(self) -> int:
+        return sum(result.after for result in self.results)
+
+    def count(self, status: str) -> int:
+        return sum(1 for result in self.results if result.status == status)
+
+
+def reoptimize_payload(
+    data: bytes,
+    profile: EncoderProfile,
+    fmt: str,
+    min_ssim: float,
+) -> Tuple[bytes, int, float]:
+    """Re-encode an existing derivative; returns ``(payload, quality, MS-SSIM against the derivative)``.
+
+    JPEG searches the lowest quality that still reaches ``min_ssim``; AVIF and
+    WebP use the fixed quality of the responsive variants.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        transpose = ORIENTATION_TRANSPOSE.get(img.getexif().get(EXIF_ORIENTATION))
+        metadata = profile.metadata_for(img)
+        reference = img.convert("RGB")
+    if transpose is not None:
+        # 旧构建保留了方向标签而不旋转像素；新文件不带标签，要先转正
+        reference = reference.transpose(transpose)
+    options = profile.save_options(fmt, metadata)
+    if fmt == "JPEG":
+        quality, _ = search_quality(reference, QualityTarget(min_ssim=min_ssim), save_options=options)
+    else:
+        quality = dict(MODERN_FORMATS)[fmt]
+    buffer = io.BytesIO()
+    reference.save(buffer, fmt, quality=quality, **options)
+    payload = buffer.getvalue()
+    return payload, quality, derivative_ssim(reference, payload)
+
+
+def reoptimize_archive(
+    root: Path,
+    *,
+    projects: Iterable[str] = (),
+    profile_name: str | None = None,
+    fmt: str = "JPEG",
+    min_ssim: float = REOPTIMIZE_MIN_SSIM,
+    workers: int | None = None,
+    dry_run: bool = False,
+) -> List[ProjectReport]:
+    """Re-encode every ``public/background`` image under ``root/project`` in parallel.
+
+    A re-encode replaces the file only when it is smaller and its MS-SSIM
+    against the current file reaches ``min_ssim``; originals in
+    ``public/gallery`` are never touched. Changing ``fmt`` renames the file
+    and rewrites its references in the project page and the homepage, but
+    only for images without an original: 更新图库 names every background after
+    its original and would rebuild the rest as JPEG anyway.
+    """
+    wanted = set(projects)
+    reports: Dict[Path, ProjectReport] = {}
+    tasks: List[Tuple[Path, Path, Path, EncoderProfile, str]] = []
+    for project_dir in sorted((root / "project").iterdir()):
+        background = project_dir / "public" / "background"
+        if (wanted and project_dir.name not in wanted) or not background.is_dir():
+            continue
+        profile = resolve_encoder_profile(project_dir, profile_name)
+        gallery = project_dir / "public" / "gallery"
+        originals = set(list_images(gallery)) if gallery.is_dir() else set()
+        reports[project_dir] = ProjectReport(project=project_dir.name)
+        for name in list_images(background, BACKGROUND_EXTENSIONS):
+            path = background / name
+            if name in originals:
+                # 更新图库按原图文件名生成 background（内容总是 JPEG），不能改名
+                target_fmt, target = "JPEG", path
+            else:
+                extension = f".{FORMAT_EXTENSIONS[fmt]}"
+                keep = {".jpg", ".jpeg"} if fmt == "JPEG" else {extension}
+                target_fmt = fmt
+                target = path if path.suffix.lower() in keep else path.with_suffix(extension)
+            tasks.append((project_dir, path, target, profile, target_fmt))
+
+    try:
+        with worker_pool(resolve_worker_count(workers)) as pool:
+            futures = {
+                pool.submit(_reoptimize_job, path, target, profile, target_fmt, min_ssim): (project_dir, path, target)
+                for project_dir, path, target, profile, target_fmt in tasks
+            }
+            with tqdm(total=len(futures), desc="Re-optimizing archive") as pbar:
+                for future in as_completed(futures):
+                    project_dir, path, target = futures[future]
+                    try:
+                        result, payload = future.result()
+                        if result.accepted and not dry_run:
+                            atomic_write(result.target, payload)
+                    except Exception as exc:
+                        # worker 崩溃或写入失败只记为这一张失败，其余图片照常处理
+                        result = _failed_result(path, target, exc)
+                    reports[project_dir].results.append(result)
+                    pbar.update(1)
+    finally:
+        # 即使中途出错，已经写入的新文件也要完成改名、改写引用与 manifest 更新
+        for project_dir, report in reports.items():
+            report.results.sort(key=lambda result: result.path.name)
+            if not dry_run:
+                _finish_project(root, project_dir, report)
+    return list(reports.values())
+
+
+def _failed_result(path: Path, target: Path, exc: BaseException) -> ReoptimizeResult:
+    try:
+        before = os.path.getsize(path)
+    except OSError:
+        before = 0
+    return ReoptimizeResult(
+        path=path, target=target, before=before, after=before,
+        status="failed", error=f"{type(exc).__name__}: {exc}",
+    )
+
+
+def _finish_project(root: Path, project_dir: Path, report: ProjectReport) -> None:
+    renamed = {
+        result.path.name: result.target.name
+        for result in report.results
+        if result.accepted and result.target != result.path
+    }
+    if renamed:
+        # 先让页面指向新文件，再删除旧文件，中途中断也不会出现失效的引用
+        report.html_files = rewrite_html_references(root, project_dir, renamed)
+        for old in renamed:
+            (project_dir / "public" / "background" / old).unlink(missing_ok=True)
+    if any(result.accepted for result in report.results) and (project_dir / "manifest.json").exists():
+        ProjectManifest.build(project_dir).save()
+
+
+def _encoded_pattern(text: str) -> str:
+    """Regex matching ``text`` with each character either raw or percent-encoded (either hex case)."""
+    parts = []
+    for char in text:
+        encoded = "".join(f"%{byte:02X}" for byte in char.encode("utf-8"))
+        parts.append(f"(?:{re.escape(char)}|{encoded}|{encoded.lower()})")
+    return "".join(parts)
+
+
+def _renamed_url(matched: str, old: str, new: str) -> str:
+    # 保持原引用的写法：原样、只把空格写成 %20（新增图库的首页卡片），其余情况完整编码
+    if matched == old:
+        return new
+    if matched == old.replace(" ", "%20"):
+        return new.replace(" ", "%20")
+    return quote(new)
+
+
+def rewrite_html_references(root: Path, project_dir: Path, renamed: Dict[str, str]) -> int:
+    """Point the project page and the homepage pages at renamed background files; returns the files changed.
+
+    References are compared percent-decoded, so a raw project directory
+    followed by a ``%20``-encoded file name matches as well as fully raw or
+    fully encoded URLs.
+    """
+    if not renamed:
+        return 0
+    # 项目页用相对自身的 ./public/…，首页与 homepage/ 下的页面带上项目目录
+    prefixes = "|".join(_encoded_pattern(prefix) for prefix in ("./", f"project/{project_dir.name}/"))
+    names = "|".join(_encoded_pattern(old) for old in sorted(renamed, key=len, reverse=True))
+    pattern = re.compile(f"((?:{prefixes}){_encoded_pattern('public/background/')})({names})")
+
+    def replace(match: re.Match) -> str:
+        old = unquote(match.group(2))
+        return match.group(1) + _renamed_url(match.group(2), old, renamed[old])
+
+    pages = list(project_dir.glob("*.html"))
+    pages += list(root.glob("*.html")) + list((root / "homepage").glob("*.html"))
+    changed = 0
+    for page in pages:
+        text = page.read_text(encoding="utf-8")
+        updated = pattern.sub(replace, text)
+        if updated != text:
+            atomic_write(page, updated)
+            changed += 1
+    return changed
+
+
+def print_reoptimize_report(reports: List[ProjectReport], *, dry_run: bool = False) -> None:
+    mb = 1024 * 1024
+    for report in reports:
+        if not report.results:
+            continue
+        saved = report.before - report.after
+        line = (
+            f"{report.project}：{report.before / mb:.1f} MB → {report.after / mb:.1f} MB"
+            f"（-{saved / max(report.before, 1) * 100:.1f}%），采用 {report.count('accepted')}/{len(report.results)} 张"
+        )
+        skipped = [
+            f"{label} {report.count(status)}"
+            for status, label in (("larger", "未变小"), ("below-ssim", "低于 SSIM"), ("failed", "失败"))
+            if report.count(status)
+        ]
+        if skipped:
+            line += f"，跳过 {'、'.join(skipped)}"
+        if report.html_files:
+            line += f"，改写 {report.html_files} 个页面"
+        print(line)
+        for result in report.results:
+            if result.status == "failed":
+                print(f"  ⚠️ {result.path.name}：{result.error}")
+    before = sum(report.before for report in reports)
+    after = sum(report.after for report in reports)
+    verb = "预计" if dry_run else "已"
+    print(
+        f"✅ {sum(len(report.results) for report in reports)} 张图片：{before / mb:.1f} MB → {after / mb:.1f} MB，"
+        f"{verb}节省 {(before - after) / mb:.1f} MB（{(before - after) / max(before, 1) * 100:.1f}%）"
+    )
+
+
+def _reoptimize_job(
+    path: Path,
+    target: Path,
+    profile: EncoderProfile,
+    fmt: str,
+    min_ssim: float,
+) -> Tuple[ReoptimizeResult, bytes | None]:
+    # 在 worker 进程中运行，只读不写；采用的结果交回主进程写入
+    before = os.path.getsize(path)
+    result = ReoptimizeResult(path=path, target=target, before=before, after=before, status="failed")
+    if target != path and target.exists():
+        result.error = f"{target.name} 已存在"
+        return result, None
+    try:
+        payload, result.quality, score = reoptimize_payload(path.read_bytes(), profile, fmt, min_ssim)
+    except (OSError, UnidentifiedImageError, ValueError) as exc:
+        result.error = f"{type(exc).__name__}: {exc}"
+        return result, None
+    result.ssim = round(score, 5)
+    if len(payload) >= before:
+        result.status = "larger"
+        return result, None
+    if score < min_ssim:
+        result.status = "below-ssim"
+        return result, None
+    result.status = "accepted"
+    result.after = len(payload)
+    return result, payload
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+from PIL import Image
+
+from benchmark_utils import copy_project_corpus
+from gallery_utils import PROFILE_ENV, PROJECT_CONFIG_FILENAME, gallery_jobs, resolve_encoder_profile
+
+
+def _project(root, config=None):
+    project = root / "project" / "街拍"
+    gallery = project / "public" / "gallery"
+    gallery.mkdir(parents=True)
+    Image.new("RGB", (64, 48), (10, 20, 30)).save(gallery / "a.jpg")
+    if config is not None:
+        (project / PROJECT_CONFIG_FILENAME).write_text(json.dumps(config), encoding="utf-8")
+    return project
+
+
+def test_copied_corpus_keeps_project_settings(tmp_path, monkeypatch):
+    monkeypatch.delenv(PROFILE_ENV, raising=False)
+    project = _project(tmp_path / "src", {"profile": "archive"})
+    folder = tmp_path / "work" / "project" / project.name / "public" / "gallery"
+
+    corpus = copy_project_corpus(project, folder)
+
+    workspace_project = folder.parent.parent
+    assert corpus.images == 1
+    assert (workspace_project / PROJECT_CONFIG_FILENAME).read_bytes() == (project / PROJECT_CONFIG_FILENAME).read_bytes()
+    assert resolve_encoder_profile(workspace_project).name == "archive"
+    (workspace_project / "public" / "background").mkdir()
+    assert {job.profile.name for job in gallery_jobs(workspace_project)} == {"archive"}
+
+
+def test_copied_corpus_without_config_uses_defaults(tmp_path, monkeypatch):
+    monkeypatch.delenv(PROFILE_ENV, raising=False)
+    project = _project(tmp_path / "src")
+    folder = tmp_path / "work" / "project" / project.name / "public" / "gallery"
+
+    copy_project_corpus(project, folder)
+
+    assert not (folder.parent.parent / PROJECT_CONFIG_FILENAME).exists()
+    assert resolve_encoder_profile(folder.parent.parent) == resolve_encoder_profile(project)
+
+
+def test_empty_gallery_is_rejected(tmp_path):
+    (tmp_path / "public" / "gallery").mkdir(parents=True)
+    with pytest.raises(FileNotFoundError):
+        copy_project_corpus(tmp_path, tmp_path / "work")
@@ -0,0 +1,54 @@
+import os
+from dataclasses import replace
+
+from PIL import Image
+
+from gallery_utils import ENCODER_PROFILES, BuildCache, compress_batch, gallery_jobs
+
+
+def _built_project(tmp_path):
+    gallery = tmp_path / "public" / "gallery"
+    gallery.mkdir(parents=True)
+    (tmp_path / "public" / "background").mkdir()
+    Image.new("RGB", (1600, 1000), (40, 90, 160)).save(gallery / "a.jpg")
+    cache = BuildCache.load(tmp_path)
+    (job,) = gallery_jobs(tmp_path)
+    (result,) = compress_batch([job], workers=1, cache=cache)
+    assert result.ok, result.error
+    return BuildCache.load(tmp_path), job
+
+
+def test_unchanged_source_and_settings_are_fresh(tmp_path):
+    cache, job = _built_project(tmp_path)
+    assert cache.is_fresh(job)
+
+
+def test_touched_but_identical_source_stays_fresh(tmp_path):
+    cache, job = _built_project(tmp_path)
+    stat = job.source.stat()
+    os.utime(job.source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+    assert cache.is_fresh(job)
+
+
+def test_changed_content_invalidates(tmp_path):
+    cache, job = _built_project(tmp_path)
+    Image.new("RGB", (1600, 1000), (200, 30, 30)).save(job.source)
+    assert not cache.is_fresh(job)
+
+
+def test_changed_parameters_invalidate(tmp_path):
+    cache, job = _built_project(tmp_path)
+    assert not cache.is_fresh(replace(job, quality=job.quality + 5))
+    assert not cache.is_fresh(replace(job, target_size=(1200, 800)))
+
+
+def test_changed_profile_invalidates(tmp_path):
+    cache, job = _built_project(tmp_path)
+    other = next(profile for name, profile in ENCODER_PROFILES.items() if name != job.profile.name)
+    assert not cache.is_fresh(replace(job, profile=other))
+
+
+def test_missing_output_invalidates(tmp_path):
+    cache, job = _built_project(tmp_path)
+    job.blur_path().unlink()
+    assert not cache.is_fresh(job)
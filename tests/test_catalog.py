@@ -0,0 +1,41 @@
+import os
+
+from PIL import Image
+
+import catalog_utils
+from catalog_utils import open_catalog, update_catalog
+
+
+def _photo(path, color, size=(300, 200)):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", size, color).save(path)
+
+
+def test_catalog_only_rereads_files_whose_size_or_mtime_changed(tmp_path, monkeypatch):
+    gallery = tmp_path / "project" / "trip" / "public" / "gallery"
+    _photo(gallery / "a.jpg", (10, 20, 30))
+    _photo(gallery / "b.jpg", (200, 20, 30))
+    _photo(tmp_path / "project" / "trip" / "public" / "zoom" / "a_files" / "0" / "0_0.jpg", (0, 0, 0))
+    _photo(tmp_path / "journals" / "day1" / "assets" / "c.png", (0, 90, 0))
+    conn = open_catalog(tmp_path)
+
+    first = update_catalog(conn, tmp_path)
+    assert (first.scanned, first.added) == (3, 3)  # 缩放瓦片不进目录
+
+    def no_reread(path):
+        raise AssertionError(f"unchanged file reopened: {path}")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(catalog_utils, "read_photo_metadata", no_reread)
+        second = update_catalog(conn, tmp_path)
+    assert (second.unchanged, second.added, second.updated) == (3, 0, 0)
+
+    _photo(gallery / "a.jpg", (10, 20, 30), size=(600, 400))
+    stat = (gallery / "b.jpg").stat()
+    os.utime(gallery / "b.jpg", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    (tmp_path / "journals" / "day1" / "assets" / "c.png").unlink()
+
+    third = update_catalog(conn, tmp_path)
+    assert (third.updated, third.unchanged, third.removed) == (2, 0, 1)
+    width = conn.execute("SELECT width FROM photos WHERE path = ?", ("project/trip/public/gallery/a.jpg",)).fetchone()[0]
+    assert width == 600
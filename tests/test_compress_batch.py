@@ -0,0 +1,71 @@
+import threading
+
+from PIL import Image
+
+import gallery_utils
+from gallery_utils import DEFAULT_TARGET_SIZE, CompressJob, compress_batch
+
+
+def _make_sources(folder, count):
+    folder.mkdir()
+    sources = []
+    for index in range(count):
+        path = folder / f"IMG_{index:02d}.jpg"
+        Image.new("RGB", (3000, 2000), (40 * index % 256, 120, 200)).save(path, quality=90)
+        sources.append(path)
+    return sources
+
+
+def _run_in_thread(jobs, **kwargs):
+    results = []
+    thread = threading.Thread(target=lambda: results.extend(compress_batch(jobs, **kwargs)), daemon=True)
+    thread.start()
+    thread.join(timeout=120)
+    assert not thread.is_alive(), "compress_batch 卡住"
+    return results
+
+
+def test_compress_batch_with_memory_budget_finishes(tmp_path):
+    # 预算只够同时处理一两张：读线程在等内存闸门时，进程池仍在按需启动 worker
+    sources = _make_sources(tmp_path / "gallery", 6)
+    output = tmp_path / "background"
+    output.mkdir()
+    jobs = [CompressJob(source=source, destination=output / source.name) for source in sources]
+
+    results = _run_in_thread(jobs, workers=2, memory_mb=64)
+
+    assert [result.job.source for result in results] == sources
+    assert all(result.ok for result in results), [result.error for result in results]
+    for source in sources:
+        with Image.open(output / source.name) as img:
+            assert max(img.size) <= max(DEFAULT_TARGET_SIZE)
+
+
+def test_unexpected_stage_error_fails_the_image_instead_of_hanging(tmp_path, monkeypatch):
+    sources = _make_sources(tmp_path / "gallery", 3)
+    output = tmp_path / "background"
+    output.mkdir()
+    jobs = [CompressJob(source=source, destination=output / source.name) for source in sources]
+
+    def broken_write(files):
+        raise ValueError("boom")
+
+    monkeypatch.setattr(gallery_utils, "_write_files", broken_write)
+    results = _run_in_thread(jobs, workers=1)
+
+    assert len(results) == len(sources)
+    assert all(result.error == "ValueError: boom" for result in results)
+
+
+def test_oversized_png_is_reported_as_full_decode(tmp_path, capsys):
+    source = tmp_path / "panorama.png"
+    Image.new("RGB", (6000, 2000), (30, 90, 150)).save(source)
+    output = tmp_path / "background"
+    output.mkdir()
+    job = CompressJob(source=source, destination=output / "panorama.png")
+
+    (result,) = _run_in_thread([job], workers=2, memory_mb=32)
+
+    assert result.ok, result.error
+    assert result.meta["memory_report"]["full_decode"]
+    assert "panorama.png" in capsys.readouterr().out
@@ -0,0 +1,46 @@
+from PIL import Image, ImageFilter
+
+from image_analysis import ImageScore, rank_covers, score_frame
+
+
+def _scene(seed):
+    base = Image.radial_gradient("L").resize((600, 400)).convert("RGB")
+    return Image.blend(base, Image.effect_noise((600, 400), 40 + seed).convert("RGB"), 0.4)
+
+
+def _score(name, img):
+    return ImageScore(name=name, **score_frame(img))
+
+
+def test_blur_lowers_sharpness():
+    sharp = score_frame(_scene(0))
+    soft = score_frame(_scene(0).filter(ImageFilter.GaussianBlur(6)))
+    assert soft["sharpness"] < sharp["sharpness"] / 4
+    assert abs(soft["brightness"] - sharp["brightness"]) < 10
+
+
+def test_clipping_is_measured():
+    frame = Image.new("L", (200, 100), 128)
+    frame.paste(0, (0, 0, 50, 100))
+    frame.paste(255, (150, 0, 200, 100))
+    scores = score_frame(frame)
+    assert abs(scores["shadows"] - 0.25) < 0.02
+    assert abs(scores["highlights"] - 0.25) < 0.02
+
+
+def test_blurred_frame_is_flagged_and_ranked_last():
+    scores = [_score(f"sharp-{i}.jpg", _scene(i)) for i in range(3)]
+    scores.append(_score("aaa-soft.jpg", _scene(0).filter(ImageFilter.GaussianBlur(6))))
+
+    ranked = rank_covers(scores)
+    assert [score.blurry for score in ranked] == [False, False, False, True]
+    # 即使文件名排在最前，模糊帧也排在清晰帧之后
+    assert ranked[-1].name == "aaa-soft.jpg"
+    assert all(0.0 <= score.cover <= 1.0 for score in ranked)
+
+
+def test_rank_covers_is_deterministic_on_ties():
+    frame = _scene(1)
+    ranked = rank_covers([_score(name, frame) for name in ("b.jpg", "a.jpg", "c.jpg")])
+    assert [score.name for score in ranked] == ["a.jpg", "b.jpg", "c.jpg"]
+    assert rank_covers([]) == []
@@ -0,0 +1,17 @@
+from PIL import Image
+
+from gallery_utils import build_cover_thumbnails
+
+
+def test_rebuilding_a_cover_keeps_covers_of_similar_names(tmp_path):
+    covers = tmp_path / "cover"
+    for stem in ("IMG", "IMG-1"):
+        Image.new("RGB", (1200, 800), (90, 140, 200)).save(tmp_path / f"{stem}.jpg")
+        build_cover_thumbnails(tmp_path / f"{stem}.jpg", covers)
+    kept = sorted(path.name for path in covers.iterdir() if path.name.startswith("IMG-1-"))
+    (covers / "IMG-400.gif").write_bytes(b"")  # 旧格式的封面应被清理
+
+    build_cover_thumbnails(tmp_path / "IMG.jpg", covers)
+
+    assert sorted(path.name for path in covers.iterdir() if path.name.startswith("IMG-1-")) == kept
+    assert not (covers / "IMG-400.gif").exists()
@@ -0,0 +1,76 @@
+import io
+import random
+from pathlib import Path
+
+from PIL import Image, ImageFilter
+
+from image_analysis import ArchiveImage, BKTree, find_duplicate_groups, hamming, ms_ssim
+
+
+def _frame():
+    base = Image.radial_gradient("L").resize((256, 256)).convert("RGB")
+    return Image.blend(base, Image.effect_noise((256, 256), 30).convert("RGB"), 0.3)
+
+
+def _jpeg(img, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=quality)
+    with Image.open(buffer) as decoded:
+        return decoded.convert("RGB")
+
+
+def test_ms_ssim_of_identical_frames_is_one():
+    frame = _frame()
+    assert abs(ms_ssim(frame, frame.copy()) - 1.0) < 1e-6
+
+
+def test_ms_ssim_drops_with_degradation():
+    frame = _frame()
+    light = ms_ssim(frame, _jpeg(frame, 90))
+    heavy = ms_ssim(frame, _jpeg(frame, 10))
+    blurred = ms_ssim(frame, frame.filter(ImageFilter.GaussianBlur(4)))
+    assert 1.0 > light > heavy
+    assert blurred < light
+
+
+def test_ms_ssim_handles_frames_smaller_than_all_scales():
+    small = _frame().resize((24, 24))
+    assert abs(ms_ssim(small, small.copy()) - 1.0) < 1e-6
+
+
+def _archive_image(name, phash, dhash, width=1800, height=1200, cost=100):
+    return ArchiveImage(project="p", path=Path(name), width=width, height=height, phash=phash, dhash=dhash, cost=cost)
+
+
+def test_bktree_radius_search_matches_brute_force():
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(300)]
+    tree = BKTree()
+    for index, value in enumerate(values):
+        tree.add(value, index)
+    query = values[0] ^ 0b1011  # 距离第一个值 3 位
+    for radius in (0, 3, 12):
+        expected = {index for index, value in enumerate(values) if hamming(query, value) <= radius}
+        assert {item for _, item in tree.search(query, radius)} == expected
+
+
+def test_find_duplicate_groups_keeps_largest_and_merges_transitively():
+    base = 0xF0F0_F0F0_0F0F_0F0F
+    images = [
+        _archive_image("small.jpg", base, base, width=900, height=600, cost=50),
+        _archive_image("large.jpg", base ^ 0b1, base ^ 0b1),
+        _archive_image("chain.jpg", base ^ 0b111, base ^ 0b111, cost=70),  # 与 large 相差 2 位，与 small 3 位
+        _archive_image("other.jpg", ~base & (2**64 - 1), base),
+    ]
+
+    (group,) = find_duplicate_groups(images, threshold=2)
+
+    assert group.keeper.path.name == "large.jpg"
+    assert sorted(image.path.name for image in group.duplicates) == ["chain.jpg", "small.jpg"]
+    assert group.wasted_bytes == 120
+
+
+def test_find_duplicate_groups_requires_both_hashes():
+    base = 0x1234_5678_9ABC_DEF0
+    images = [_archive_image("a.jpg", base, base), _archive_image("b.jpg", base, ~base & (2**64 - 1))]
+    assert find_duplicate_groups(images, threshold=4) == []
@@ -0,0 +1,43 @@
+import pytest
+from PIL import Image
+
+import journal_utils
+
+
+def _hero(tmp_path):
+    assets = tmp_path / "assets"
+    assets.mkdir()
+    Image.new("RGB", (1200, 800), (120, 90, 60)).save(assets / "hero.jpg")
+    return assets
+
+
+def test_hero_covers_are_built(tmp_path):
+    assets = _hero(tmp_path)
+    warnings = []
+    covers = journal_utils._build_hero_covers("./assets/hero.jpg", assets, tmp_path / "cover", warnings)
+    assert covers and not warnings
+
+
+def test_decompression_bomb_falls_back_to_uncropped_hero(tmp_path, monkeypatch):
+    assets = _hero(tmp_path)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    warnings = []
+    covers = journal_utils._build_hero_covers("./assets/hero.jpg", assets, tmp_path / "cover", warnings)
+    assert covers is None
+    assert len(warnings) == 1
+    assert not (tmp_path / "cover").exists()
+
+
+@pytest.mark.parametrize("error", [ValueError("unsupported mode"), ImportError("numpy")])
+def test_cover_errors_fall_back_to_uncropped_hero(tmp_path, monkeypatch, error):
+    assets = _hero(tmp_path)
+
+    def broken(source, folder):
+        folder.mkdir(parents=True)
+        (folder / "hero-400.jpg").write_bytes(b"partial")
+        raise error
+
+    monkeypatch.setattr(journal_utils, "build_cover_thumbnails", broken)
+    warnings = []
+    assert journal_utils._build_hero_covers("./assets/hero.jpg", assets, tmp_path / "cover", warnings) is None
+    assert warnings and not (tmp_path / "cover").exists()
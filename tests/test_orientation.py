@@ -0,0 +1,57 @@
+import base64
+import io
+
+from PIL import Image
+
+from gallery_utils import (
+    EXIF_ORIENTATION,
+    ENCODER_PROFILES,
+    BuildCache,
+    ProjectManifest,
+    build_contact_sheets,
+    compress_batch,
+    gallery_jobs,
+    read_image_size,
+)
+
+
+def _portrait_shot(path):
+    # 相机竖拍：像素按横向存储（宽 > 高），方向标签 6 表示显示时顺时针转 90°
+    img = Image.new("RGB", (2400, 1600), (200, 40, 40))
+    img.paste((40, 40, 200), (0, 0, 1200, 1600))
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6
+    img.save(path, exif=exif.tobytes())
+
+
+def test_orientation_6_source_yields_upright_derivatives(tmp_path):
+    gallery = tmp_path / "public" / "gallery"
+    gallery.mkdir(parents=True)
+    (tmp_path / "public" / "background").mkdir()
+    _portrait_shot(gallery / "portrait.jpg")
+
+    cache = BuildCache.load(tmp_path)
+    (result,) = compress_batch(gallery_jobs(tmp_path), workers=1, cache=cache)
+    assert result.ok, result.error
+    assert result.job.profile == ENCODER_PROFILES["web"]
+
+    background = tmp_path / "public" / "background" / "portrait.jpg"
+    assert read_image_size(background) == (1200, 1800)
+    with Image.open(background) as img:
+        assert img.getexif().get(EXIF_ORIENTATION) in (None, 1)
+    for output in cache.entries[cache.key_for(background)]["outputs"]:
+        assert output["height"] > output["width"], output["path"]
+
+    placeholder = result.meta["placeholder"]["data_uri"].split(",", 1)[1]
+    with Image.open(io.BytesIO(base64.b64decode(placeholder))) as tiny:
+        assert tiny.height > tiny.width
+
+    manifest = ProjectManifest.build(tmp_path, cache)
+    assert [(d["width"], d["height"]) for d in manifest.images[0]["derivatives"]][0] == (1200, 1800)
+
+    build_contact_sheets(tmp_path, workers=1)
+    sheet = next((tmp_path / "public" / "contact").glob("*.jpg"))
+    with Image.open(sheet) as img:
+        # 转正后左半（蓝）在上，右半（红）在下
+        top = img.getpixel((img.width // 2, 5))
+        assert top[2] > top[0]
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+from PIL import Image
+
+from page_utils import load_template, project_page_path, render_project_page, write_all_pages
+
+
+def test_template_fills_repeated_slots_and_keeps_other_braces(tmp_path):
+    path = tmp_path / "page.html"
+    path.write_text("<title>{{title}}</title><h1>{{ title }}</h1>{{ gallery }}<style>a{}</style>", encoding="utf-8")
+
+    template = load_template(path)
+
+    assert template.slots == {"title", "gallery"}
+    assert template.render(title="T", gallery="<img>") == "<title>T</title><h1>T</h1><img><style>a{}</style>"
+    with pytest.raises(ValueError):
+        template.render(title="T")
+
+
+def test_template_is_recompiled_when_the_file_changes(tmp_path):
+    path = tmp_path / "page.html"
+    path.write_text("a {{ x }}", encoding="utf-8")
+    assert load_template(path).render(x="1") == "a 1"
+    path.write_text("b {{ x }} {{ y }}", encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert load_template(path).render(x="1", y="2") == "b 1 2"
+
+
+def test_project_page_escapes_title(tmp_path):
+    project_dir = _project(tmp_path, "<Tom & Jerry>")
+
+    page = render_project_page(project_dir)
+
+    assert "<title>&lt;Tom &amp; Jerry&gt;</title>" in page
+    assert "<Tom & Jerry>" not in page
+    assert 'data-src="./public/background/a.jpg"' in page
+
+
+def _project(root, name, page=None):
+    project_dir = root / "project" / name
+    background = project_dir / "public" / "background"
+    background.mkdir(parents=True)
+    Image.new("RGB", (120, 80), (20, 120, 220)).save(background / "a.jpg")
+    if page:
+        (project_dir / page).write_text("old", encoding="utf-8")
+    return project_dir
+
+
+def test_write_all_pages_reuses_existing_pages_and_reports_missing(tmp_path, capsys):
+    renamed = _project(tmp_path, "RunfortheDisc", "Run for the Disc_index.html")
+    plain = _project(tmp_path, "Harbin", "Harbin_index.html")
+    _project(tmp_path, "NoPage")
+
+    written = write_all_pages(tmp_path)
+
+    assert written == [plain / "Harbin_index.html", renamed / "Run for the Disc_index.html"]
+    assert project_page_path(renamed) == renamed / "Run for the Disc_index.html"
+    assert sorted(path.name for path in renamed.glob("*_index.html")) == ["Run for the Disc_index.html"]
+    assert "<title>Run for the Disc" in (renamed / "Run for the Disc_index.html").read_text(encoding="utf-8")
+    assert not list((tmp_path / "project" / "NoPage").glob("*_index.html"))
+    assert "NoPage" in capsys.readouterr().out
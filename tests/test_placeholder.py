@@ -0,0 +1,51 @@
+import base64
+import io
+
+from PIL import Image
+
+from gallery_utils import PLACEHOLDER_SIZE, BuildCache, compress_batch, gallery_jobs, make_placeholder
+
+
+def _decode(data_uri):
+    header, encoded = data_uri.split(",", 1)
+    assert header == "data:image/jpeg;base64"
+    return Image.open(io.BytesIO(base64.b64decode(encoded)))
+
+
+def test_placeholder_is_tiny_and_keeps_aspect():
+    img = Image.new("RGB", (3000, 2000), (10, 20, 30))
+    placeholder = make_placeholder(img)
+    with _decode(placeholder["data_uri"]) as tiny:
+        assert max(tiny.size) == PLACEHOLDER_SIZE
+        assert tiny.size == (16, 11)
+    # 内联进 HTML，必须足够小
+    assert len(placeholder["data_uri"]) < 1024
+
+
+def test_placeholder_colour_is_the_average():
+    img = Image.new("RGB", (400, 400), (255, 0, 0))
+    img.paste((0, 0, 255), (0, 0, 200, 400))
+    colour = make_placeholder(img)["color"]
+    red, green, blue = (int(colour[i:i + 2], 16) for i in (1, 3, 5))
+    assert abs(red - 128) <= 4 and green <= 2 and abs(blue - 128) <= 4
+
+
+def test_placeholder_handles_non_rgb_modes():
+    assert make_placeholder(Image.new("L", (64, 32), 255))["color"] == "#ffffff"
+    assert make_placeholder(Image.new("RGBA", (64, 32), (0, 255, 0, 128)))["color"] == "#00ff00"
+
+
+def test_placeholder_attrs_after_build(tmp_path):
+    gallery = tmp_path / "public" / "gallery"
+    gallery.mkdir(parents=True)
+    (tmp_path / "public" / "background").mkdir()
+    Image.new("RGB", (1200, 800), (200, 100, 50)).save(gallery / "shot.jpg")
+
+    cache = BuildCache.load(tmp_path)
+    (result,) = compress_batch(gallery_jobs(tmp_path), workers=1, cache=cache)
+    assert result.ok, result.error
+
+    attrs = cache.placeholder_attrs(tmp_path / "public" / "background" / "shot.jpg")
+    assert attrs.startswith(' src="data:image/jpeg;base64,')
+    assert f'style="background-color: {result.meta["placeholder"]["color"]}"' in attrs
+    assert cache.placeholder_attrs(tmp_path / "public" / "background" / "missing.jpg") == ""
@@ -0,0 +1,28 @@
+from PIL import Image
+
+from gallery_utils import CACHE_FILENAME, BuildCache, compress_batch, gallery_jobs, plan_batch
+
+
+def test_plan_reads_no_pixels_and_writes_nothing(tmp_path, monkeypatch, capsys):
+    gallery = tmp_path / "public" / "gallery"
+    gallery.mkdir(parents=True)
+    (tmp_path / "public" / "background").mkdir()
+    for index in range(3):
+        Image.new("RGB", (2400, 1600), (60 * index, 100, 160)).save(gallery / f"IMG_{index}.jpg")
+    compress_batch(gallery_jobs(tmp_path), workers=1, cache=BuildCache.load(tmp_path))
+    # 没有缓存的旧项目：真正构建会解码采纳现有文件，计划不能这样做
+    (tmp_path / CACHE_FILENAME).unlink()
+    before = sorted(path.name for path in tmp_path.rglob("*"))
+    capsys.readouterr()
+
+    def no_decode(*args, **kwargs):
+        raise AssertionError("plan decoded an image")
+
+    monkeypatch.setattr(BuildCache, "_adopt_existing", no_decode)
+    cache = BuildCache.load(tmp_path, read_only=True)
+    plan = plan_batch(gallery_jobs(tmp_path), cache)
+
+    assert len(plan.skip) == 3 and not plan.encode
+    assert not cache.entries
+    assert sorted(path.name for path in tmp_path.rglob("*")) == before
+    assert capsys.readouterr().out == ""
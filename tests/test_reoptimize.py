@@ -0,0 +1,60 @@
+from urllib.parse import quote
+
+from reoptimize_utils import rewrite_html_references
+
+
+def test_rewrite_html_references_updates_project_and_homepage_pages(tmp_path):
+    project_dir = tmp_path / "project" / "trip"
+    project_dir.mkdir(parents=True)
+    (tmp_path / "homepage").mkdir()
+    page = project_dir / "trip_index.html"
+    page.write_text('<img data-src="./public/background/old shot.png">', encoding="utf-8")
+    home = tmp_path / "index.html"
+    home.write_text(f'<img src="{quote("project/trip/public/background/old shot.png")}">', encoding="utf-8")
+    untouched = tmp_path / "homepage" / "about.html"
+    untouched.write_text('<img src="project/other/public/background/old shot.png">', encoding="utf-8")
+
+    changed = rewrite_html_references(tmp_path, project_dir, {"old shot.png": "old shot.webp"})
+
+    assert changed == 2
+    assert page.read_text(encoding="utf-8") == '<img data-src="./public/background/old shot.webp">'
+    assert home.read_text(encoding="utf-8") == f'<img src="{quote("project/trip/public/background/old shot.webp")}">'
+    assert "old shot.png" in untouched.read_text(encoding="utf-8")
+
+
+def test_rewrite_html_references_matches_mixed_encodings(tmp_path):
+    project_dir = tmp_path / "project" / "【扫街】夜行"
+    project_dir.mkdir(parents=True)
+    (tmp_path / "homepage").mkdir()
+    # 新增图库 的首页卡片：项目目录原样，文件名只把空格写成 %20
+    card = tmp_path / "homepage" / "gallery.html"
+    card.write_text(
+        f'<div data-src="../project/{project_dir.name}/public/background/night%20shot.png"></div>',
+        encoding="utf-8",
+    )
+    home = tmp_path / "index.html"
+    home.write_text(f'<img src="{quote(f"project/{project_dir.name}/public/background/night shot.png")}">', encoding="utf-8")
+    page = project_dir / f"{project_dir.name}_index.html"
+    page.write_text('<img src="./public/background/night%20shot%2Epng">', encoding="utf-8")
+
+    changed = rewrite_html_references(tmp_path, project_dir, {"night shot.png": "night shot.webp"})
+
+    assert changed == 3
+    assert card.read_text(encoding="utf-8") == (
+        f'<div data-src="../project/{project_dir.name}/public/background/night%20shot.webp"></div>'
+    )
+    assert home.read_text(encoding="utf-8") == (
+        f'<img src="{quote(f"project/{project_dir.name}/public/background/night shot.webp")}">'
+    )
+    assert page.read_text(encoding="utf-8") == '<img src="./public/background/night%20shot.webp">'
+
+
+def test_rewrite_html_references_leaves_longer_names_alone(tmp_path):
+    project_dir = tmp_path / "project" / "trip"
+    project_dir.mkdir(parents=True)
+    page = project_dir / "trip_index.html"
+    page.write_text('<img src="./public/background/a.png"><img src="./public/background/ba.png">', encoding="utf-8")
+
+    rewrite_html_references(tmp_path, project_dir, {"a.png": "a.webp"})
+
+    assert page.read_text(encoding="utf-8") == '<img src="./public/background/a.webp"><img src="./public/background/ba.png">'
@@ -0,0 +1,66 @@
+from PIL import Image
+
+from gallery_utils import (
+    ENCODER_PROFILES,
+    GALLERY_SIZES,
+    BuildCache,
+    available_formats,
+    compress_batch,
+    gallery_jobs,
+    render_picture,
+    responsive_variants,
+)
+
+
+def test_variants_skip_full_width_jpeg():
+    variants = responsive_variants((1800, 1200), profile=ENCODER_PROFILES["web"])
+    formats = [fmt for fmt, _ in available_formats(ENCODER_PROFILES["web"].formats)]
+
+    jpeg_widths = sorted(v.width for v in variants if v.format == "JPEG")
+    # 全宽 JPEG 就是背景图本身，不再重复生成
+    assert jpeg_widths == [480, 960]
+    for fmt in formats:
+        if fmt != "JPEG":
+            assert sorted(v.width for v in variants if v.format == fmt) == [480, 960, 1800]
+
+
+def test_variants_are_capped_at_target_width():
+    variants = responsive_variants((800, 600), widths=(480, 960), profile=ENCODER_PROFILES["web"])
+    assert max(v.width for v in variants) == 800
+    assert [v.width for v in variants if v.format == "JPEG"] == [480]
+
+
+def test_built_srcsets_list_each_width_once(tmp_path):
+    gallery = tmp_path / "public" / "gallery"
+    gallery.mkdir(parents=True)
+    (tmp_path / "public" / "background").mkdir()
+    Image.new("RGB", (2400, 1600), (90, 120, 150)).save(gallery / "wide shot.jpg")
+
+    cache = BuildCache.load(tmp_path)
+    (result,) = compress_batch(gallery_jobs(tmp_path), workers=1, cache=cache)
+    assert result.ok, result.error
+
+    srcsets = cache.srcsets(tmp_path / "public" / "background" / "wide shot.jpg", "./")
+    assert list(srcsets)[-1] == "JPEG"
+    for fmt, srcset in srcsets.items():
+        candidates = [item.rsplit(" ", 1) for item in srcset.split(", ")]
+        widths = [int(width[:-1]) for _, width in candidates]
+        assert widths == sorted(set(widths)), fmt
+        assert all(url.startswith("./public/") and " " not in url for url, _ in candidates)
+
+
+def test_render_picture_lazy_and_eager():
+    srcsets = {"AVIF": "a.avif 480w", "WEBP": "a.webp 480w", "JPEG": "a-480.jpg 480w"}
+
+    lazy = render_picture('src="a.jpg" alt=""', srcsets, GALLERY_SIZES)
+    assert lazy.startswith('<picture><source type="image/avif" data-srcset="a.avif 480w"')
+    assert lazy.index("image/avif") < lazy.index("image/webp")
+    assert "image/jpeg" not in lazy
+    assert f'<img src="a.jpg" alt="" data-srcset="a-480.jpg 480w" sizes="{GALLERY_SIZES}"></picture>' in lazy
+
+    eager = render_picture('src="a.jpg"', srcsets, GALLERY_SIZES, lazy=False)
+    assert "data-srcset" not in eager and 'srcset="a.webp 480w"' in eager
+
+
+def test_render_picture_without_srcsets_is_plain_img():
+    assert render_picture('src="a.jpg"', {}, GALLERY_SIZES) == '<img src="a.jpg">'
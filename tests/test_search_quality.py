@@ -0,0 +1,49 @@
+import io
+
+from PIL import Image, ImageFilter
+
+from gallery_utils import QUALITY_SEARCH_RANGE, QualityTarget, search_quality
+from image_analysis import ms_ssim
+
+
+def _photo():
+    base = Image.linear_gradient("L").resize((480, 320)).convert("RGB")
+    noise = Image.effect_noise((480, 320), 40).convert("RGB")
+    return Image.blend(base, noise, 0.35).filter(ImageFilter.GaussianBlur(0.6))
+
+
+def _encode(img, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def test_budget_picks_highest_quality_that_fits():
+    img = _photo()
+    budget = len(_encode(img, 70))
+
+    quality, encodes = search_quality(img, QualityTarget(max_bytes=budget))
+
+    assert len(_encode(img, quality)) <= budget
+    assert quality >= 70
+    assert len(_encode(img, quality + 1)) > budget
+    assert encodes < QUALITY_SEARCH_RANGE[1] - QUALITY_SEARCH_RANGE[0]
+
+
+def test_budget_below_lowest_quality_falls_back_to_minimum():
+    quality, _ = search_quality(_photo(), QualityTarget(max_bytes=100))
+    assert quality == QUALITY_SEARCH_RANGE[0]
+
+
+def test_ssim_floor_picks_lowest_quality_that_reaches_it():
+    img = _photo()
+    target = QualityTarget(min_ssim=0.97)
+
+    quality, _ = search_quality(img, target)
+
+    def score(q):
+        with Image.open(io.BytesIO(_encode(img, q))) as decoded:
+            return ms_ssim(img, decoded.convert("RGB"))
+
+    assert score(quality) >= 0.97
+    assert quality == QUALITY_SEARCH_RANGE[0] or score(quality - 1) < 0.97
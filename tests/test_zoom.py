@@ -0,0 +1,44 @@
+import math
+import re
+
+from PIL import Image
+
+from gallery_utils import ZOOM_OVERLAP, ZOOM_TILE_SIZE, build_zoom_pyramid
+
+
+def test_dzi_levels_and_tile_geometry(tmp_path):
+    source = tmp_path / "wide.jpg"
+    Image.new("RGB", (1000, 600), (80, 120, 160)).save(source)
+
+    info = build_zoom_pyramid(source, tmp_path / "zoom")
+
+    files = tmp_path / "zoom" / "wide_files"
+    top = math.ceil(math.log2(1000))
+    assert info["levels"] == top + 1
+    assert sorted(int(path.name) for path in files.iterdir()) == list(range(top + 1))
+    descriptor = (tmp_path / "zoom" / "wide.dzi").read_text(encoding="utf-8")
+    assert re.search(r'Width="1000" Height="600"', descriptor)
+    assert f'TileSize="{ZOOM_TILE_SIZE}"' in descriptor and f'Overlap="{ZOOM_OVERLAP}"' in descriptor
+
+    tiles = 0
+    for level in range(top + 1):
+        scale = 2 ** (top - level)
+        width, height = math.ceil(1000 / scale), math.ceil(600 / scale)
+        cols, rows = math.ceil(width / ZOOM_TILE_SIZE), math.ceil(height / ZOOM_TILE_SIZE)
+        names = {path.name for path in (files / str(level)).iterdir()}
+        assert names == {f"{col}_{row}.jpg" for col in range(cols) for row in range(rows)}
+        tiles += len(names)
+        for col in range(cols):
+            for row in range(rows):
+                left = col * ZOOM_TILE_SIZE - (ZOOM_OVERLAP if col else 0)
+                top_edge = row * ZOOM_TILE_SIZE - (ZOOM_OVERLAP if row else 0)
+                right = min(width, (col + 1) * ZOOM_TILE_SIZE + ZOOM_OVERLAP)
+                bottom = min(height, (row + 1) * ZOOM_TILE_SIZE + ZOOM_OVERLAP)
+                with Image.open(files / str(level) / f"{col}_{row}.jpg") as tile:
+                    assert tile.size == (right - left, bottom - top_edge)
+    assert info["tiles"] == tiles
+
+    with Image.open(files / "0" / "0_0.jpg") as tile:
+        assert tile.size == (1, 1)
+    with Image.open(files / str(top) / "1_0.jpg") as tile:
+        assert tile.size == (ZOOM_TILE_SIZE + 2 * ZOOM_OVERLAP, ZOOM_TILE_SIZE + ZOOM_OVERLAP)
@@ -0,0 +1,85 @@
+import argparse
+import shutil
+import sys
+from pathlib import Path
+
+from benchmark_utils import (
+    DEFAULT_REGRESSION_THRESHOLD,
+    compare_with_baseline,
+    copy_project_corpus,
+    generate_synthetic_corpus,
+    load_report,
+    make_workspace,
+    run_benchmark,
+    save_report,
+)
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+
+
+def parse_size(raw: str):
+    width, _, height = raw.lower().partition("x")
+    return int(width), int(height)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="图库构建性能测试：端到端与分阶段耗时、吞吐量、峰值 RSS 与输出体积")
+    parser.add_argument("--project", help="使用 project/ 下的真实项目（会复制到临时目录，不会改动原项目）")
+    parser.add_argument("--count", type=int, default=20, help="合成图片数量（默认 20）")
+    parser.add_argument("--size", type=parse_size, default=(6000, 4000), help="合成图片尺寸，例如 6000x4000")
+    parser.add_argument("--seed", type=int, default=0, help="合成图片的随机种子")
+    parser.add_argument("--workers", type=int, help="worker 数量（默认同 GALLERY_WORKERS / CPU 核心数）")
+    parser.add_argument("--output", type=Path, default=Path("benchmark.json"), help="结果 JSON 路径")
+    parser.add_argument("--baseline", type=Path, help="与之前保存的结果对比，出现退化时以非零状态退出")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD, help="判定退化的相对变化（默认 0.10）")
+    parser.add_argument("--keep", action="store_true", help="保留临时工作目录以便检查输出")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    workspace = make_workspace()
+    try:
+        if args.project:
+            corpus = copy_project_corpus(
+                PROJECT_ROOT / "project" / args.project,
+                workspace / "project" / args.project / "public" / "gallery",
+            )
+        else:
+            print(f"生成 {args.count} 张 {args.size[0]}x{args.size[1]} 合成图片……")
+            corpus = generate_synthetic_corpus(
+                workspace / "project" / "synthetic" / "public" / "gallery", args.count, args.size, args.seed
+            )
+        report = run_benchmark(corpus, workers=args.workers)
+    finally:
+        if args.keep:
+            print(f"临时工作目录：{workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    save_report(report, args.output)
+    cold = report["end_to_end"]["cold"]
+    print(
+        f"✅ {report['corpus']['name']}：冷构建 {cold['seconds']:.2f}s（{cold['images_per_sec']:.2f} 张/s，"
+        f"{cold['mb_per_sec']:.1f} MB/s，输出 {cold['output_bytes'] / 1024 / 1024:.1f} MB），"
+        f"热构建 {report['end_to_end']['warm']['seconds']:.2f}s"
+    )
+    for name, stage in report["stages"].items():
+        print(f"  {name}: {stage['seconds']:.2f}s（{stage['images_per_sec']:.2f} 张/s）")
+    for name, peak in report.get("peak_rss", {}).items():
+        print(f"  峰值 RSS {name}: {peak / 1024 / 1024:.0f} MB")
+    print(f"结果已写入 {args.output}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(report, load_report(args.baseline), args.threshold)
+        if regressions:
+            print(f"❌ 相对基线 {args.baseline} 出现 {len(regressions)} 项退化：")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"✅ 与基线 {args.baseline} 相比没有超过 {args.threshold * 100:.0f}% 的退化。")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
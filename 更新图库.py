@@ -2,74 +2,61 @@ import os
 import sys
 import subprocess
 import webbrowser
-from PIL import Image
-import re
 import socket
 
-def compress_image(input_path, output_path, target_size=(1800, 1200), quality=70):
-    with Image.open(input_path) as img:
-        img = img.convert("RGB")
-        img.thumbnail(target_size)
-        img.save(output_path, "JPEG", quality=quality)
+from gallery_utils import (
+    BACKGROUND_EXTENSIONS,
+    BuildCache,
+    compress_batch,
+    finish_gallery,
+    gallery_jobs,
+    list_images,
+    plan_batch,
+    print_plan,
+)
+from page_utils import write_all_pages, write_project_page
+
+
+def plan_update(project_path, workers=None):
+    # 只读文件头与构建缓存，不解码、不写入任何文件
+    gallery_path = os.path.join(project_path, 'public', 'gallery')
+    background_path = os.path.join(project_path, 'public', 'background')
+    gallery_images = set(list_images(gallery_path))
+    background_images = set(list_images(background_path, BACKGROUND_EXTENSIONS)) if os.path.isdir(background_path) else set()
+    cache = BuildCache.load(project_path, read_only=True)
+    removed = [os.path.join(background_path, img_name) for img_name in sorted(background_images - gallery_images)]
+    print_plan(plan_batch(gallery_jobs(project_path, gallery_images), cache, removed=removed), workers)
+
 
 def update_gallery(project_path):
     public_path = os.path.join(project_path, 'public')
     gallery_path = os.path.join(public_path, 'gallery')
     background_path = os.path.join(public_path, 'background')
-    html_path = os.path.join(project_path, f"{os.path.basename(project_path)}_index.html")
 
     # 确保 background 目录存在
     os.makedirs(background_path, exist_ok=True)
 
     # 获取 gallery 和 background 中的图片文件名
-    gallery_images = set(img for img in os.listdir(gallery_path) if img.lower().endswith(('png', 'jpg', 'jpeg')))
-    background_images = set(img for img in os.listdir(background_path) if img.lower().endswith(('png', 'jpg', 'jpeg')))
+    gallery_images = set(list_images(gallery_path))
+    background_images = set(list_images(background_path, BACKGROUND_EXTENSIONS))
 
-    # 添加新的压缩图像到 background
-    for img_name in gallery_images - background_images:
-        input_img_path = os.path.join(gallery_path, img_name)
-        output_img_path = os.path.join(background_path, img_name)
-        compress_image(input_img_path, output_img_path)
-        print(f"Compressed and added: {img_name}")
+    # 压缩新增或内容有变化的图像到 background（进程池并行压缩，构建缓存判断是否需要重建）
+    cache = BuildCache.load(project_path)
+    jobs = gallery_jobs(project_path, gallery_images)
+    for result in compress_batch(jobs, cache=cache):
+        if result.ok and not result.job.refresh_stages:
+            action = "Recompressed" if result.job.source.name in background_images else "Compressed and added"
+            print(f"{action}: {result.job.source.name}")
 
     # 删除 background 中多余的图像
     for img_name in background_images - gallery_images:
-        os.remove(os.path.join(background_path, img_name))
+        cache.remove(os.path.join(background_path, img_name))
         print(f"Deleted from background: {img_name}")
+    cache.save()
+    manifest = finish_gallery(project_path, cache)
 
-    # 更新 HTML 文件
-    with open(html_path, 'r', encoding='utf-8') as file:
-        html_content = file.read()
-
-    # 正则表达式来查找并替换背景幻灯片和图库部分
-    background_slideshow_code = '<div class="background-slideshow" id="background-slideshow">\n'
-    for i, img_name in enumerate(sorted(gallery_images)):
-        background_slideshow_code += f'  <img class="lazy" data-src="./public/background/{img_name}" alt="背景图片{i + 1}">\n'
-    background_slideshow_code += '</div>'
-
-    gallery_code = '<div class="gallery" id="gallery">\n'
-    for i, img_name in enumerate(sorted(gallery_images)):
-        gallery_code += f'  <img class="lazy" data-src="./public/background/{img_name}" alt="背景图片{i + 1}">\n'
-    gallery_code += '</div>'
-
-    # 使用正则表达式替换 HTML 中的内容
-    html_content = re.sub(
-        r'<div class="background-slideshow" id="background-slideshow">.*?</div>',
-        background_slideshow_code,
-        html_content,
-        flags=re.DOTALL
-    )
-    html_content = re.sub(
-        r'<div class="gallery" id="gallery">.*?</div>',
-        gallery_code,
-        html_content,
-        flags=re.DOTALL
-    )
-
-    # 将修改后的内容写回 HTML 文件
-    with open(html_path, 'w', encoding='utf-8') as file:
-        file.write(html_content)
-
+    # 项目页整页由 manifest 经编译好的模板渲染，不再用正则修补旧页面
+    html_path = write_project_page(project_path, manifest)
     print(f"HTML updated in {html_path}")
 
 
@@ -96,6 +83,10 @@ def print_preview_urls(port, path=""):
 if __name__ == "__main__":
     # 自动打开与脚本同目录下的 project 文件夹
     current_dir = os.path.dirname(os.path.abspath(__file__))
+    if "--pages" in sys.argv[1:]:
+        # python3 更新图库.py --pages：不压缩图片，只按各项目的 manifest 重新生成全部项目页
+        write_all_pages(current_dir)
+        sys.exit(0)
     project_folder = os.path.join(current_dir, "project")
     
     if os.path.isdir(project_folder):
@@ -118,7 +109,12 @@ if __name__ == "__main__":
     else:
         processed_path = raw_input_path
     project_path = os.path.normpath(processed_path)
-    
+
+    if "--plan" in sys.argv[1:]:
+        # python3 更新图库.py --plan：只估算将要编码、跳过与删除的图片、耗时与输出体积
+        plan_update(project_path)
+        sys.exit(0)
+
     update_gallery(project_path)
     
     # 获取当前脚本所在目录
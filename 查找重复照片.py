@@ -0,0 +1,41 @@
+import sys
+import time
+from pathlib import Path
+
+from image_analysis import DUPLICATE_THRESHOLD, find_duplicate_groups, scan_archive
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+
+
+def format_bytes(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f} MB" if size >= 1024 * 1024 else f"{size / 1024:.0f} KB"
+
+
+def main() -> None:
+    threshold = DUPLICATE_THRESHOLD
+    if len(sys.argv) > 1:
+        try:
+            threshold = int(sys.argv[1])
+        except ValueError:
+            print(f"⚠️ 阈值 {sys.argv[1]} 不是整数，改用默认值 {DUPLICATE_THRESHOLD}。")
+
+    start = time.perf_counter()
+    images = scan_archive(PROJECT_ROOT)
+    groups = find_duplicate_groups(images, threshold)
+    elapsed = time.perf_counter() - start
+
+    for number, group in enumerate(groups, 1):
+        print(f"\n重复组 {number}（{len(group.duplicates) + 1} 张，多占 {format_bytes(group.wasted_bytes)}）")
+        print(f"  保留  {group.keeper.label}  {group.keeper.width}×{group.keeper.height}  {format_bytes(group.keeper.cost)}")
+        for image in group.duplicates:
+            print(f"  重复  {image.label}  {image.width}×{image.height}  {format_bytes(image.cost)}")
+
+    wasted = sum(group.wasted_bytes for group in groups)
+    print(
+        f"\n✅ 扫描 {len(images)} 张图片（汉明距离阈值 {threshold}），发现 {len(groups)} 组近似重复，"
+        f"共多占 {format_bytes(wasted)}，耗时 {elapsed:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import time
+from pathlib import Path
+
+from catalog_utils import (
+    CATALOG_FILENAME,
+    camera_summary,
+    collections_by_lens,
+    find_photos,
+    open_catalog,
+    update_catalog,
+)
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+
+QUERY_KEYS = {"相机": "camera", "镜头": "lens", "日期": "date", "项目": "collection"}
+
+
+def parse_query(raw: str) -> dict:
+    filters = {}
+    for part in raw.split():
+        key, _, value = part.partition("=")
+        if key not in QUERY_KEYS or not value:
+            raise ValueError(f"无法识别的筛选条件：{part}")
+        filters[QUERY_KEYS[key]] = value
+    return filters
+
+
+def print_summary(conn) -> None:
+    print("\n📷 按相机统计：")
+    for row in camera_summary(conn):
+        span = f"{row['first_shot'] or '?'} ~ {row['last_shot'] or '?'}"
+        print(f"  {row['camera']}: {row['photos']} 张（{span}）")
+    lens_rows = collections_by_lens(conn)
+    if lens_rows:
+        print("\n🔭 镜头使用情况：")
+        for row in lens_rows:
+            print(f"  {row['lens']} → {row['collection']}: {row['photos']} 张")
+
+
+def main() -> None:
+    start = time.perf_counter()
+    conn = open_catalog(PROJECT_ROOT)
+    try:
+        stats = update_catalog(conn, PROJECT_ROOT)
+        elapsed = time.perf_counter() - start
+        print(
+            f"✅ 照片目录已更新（{CATALOG_FILENAME}）：扫描 {stats.scanned}，新增 {stats.added}，"
+            f"更新 {stats.updated}，删除 {stats.removed}，未变化 {stats.unchanged}，"
+            f"失败 {stats.failed}，耗时 {elapsed:.2f}s"
+        )
+        print_summary(conn)
+
+        while True:
+            raw = input("\n输入筛选条件（例如 相机=GR 日期=2024-05-01 镜头=28mm 项目=xxx），直接回车退出: ").strip()
+            if not raw:
+                break
+            try:
+                rows = find_photos(conn, **parse_query(raw))
+            except ValueError as exc:
+                print(f"⚠️ {exc}")
+                continue
+            for row in rows:
+                print(f"  {row['captured_at'] or '未知时间'}  {row['camera_model'] or '-'}  {row['lens'] or '-'}  {row['path']}")
+            print(f"共 {len(rows)} 张")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from gallery_utils import ENCODER_PROFILES, available_formats
+from reoptimize_utils import REOPTIMIZE_FORMATS, REOPTIMIZE_MIN_SSIM, print_reoptimize_report, reoptimize_archive
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="用新的编码档位重新压缩所有项目已部署的 background 图片：只在体积变小且 MS-SSIM 达标时替换，不改动原图"
+    )
+    parser.add_argument("projects", nargs="*", help="只处理这些项目（默认 project/ 下的全部项目）")
+    parser.add_argument("--profile", choices=sorted(ENCODER_PROFILES), help="编码档位（默认同 GALLERY_PROFILE / gallery.json）")
+    parser.add_argument(
+        "--format", type=str.upper, choices=REOPTIMIZE_FORMATS, default="JPEG",
+        help="输出格式（默认 JPEG）；改格式时只转换没有原图的图片，并改写页面中的引用",
+    )
+    parser.add_argument("--min-ssim", type=float, default=REOPTIMIZE_MIN_SSIM, help=f"相对现有文件的 MS-SSIM 下限（默认 {REOPTIMIZE_MIN_SSIM}）")
+    parser.add_argument("--workers", type=int, help="worker 数量（默认同 GALLERY_WORKERS / CPU 核心数）")
+    parser.add_argument("--dry-run", action="store_true", help="只编码并报告预计节省的体积，不写入任何文件")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if args.format not in dict(available_formats()):
+        print(f"❌ 当前 Pillow 不支持编码 {args.format}。")
+        return 1
+    missing = [name for name in args.projects if not (PROJECT_ROOT / "project" / name).is_dir()]
+    if missing:
+        print(f"❌ 找不到项目：{'、'.join(missing)}")
+        return 1
+
+    start = time.perf_counter()
+    reports = reoptimize_archive(
+        PROJECT_ROOT,
+        projects=args.projects,
+        profile_name=args.profile,
+        fmt=args.format,
+        min_ssim=args.min_ssim,
+        workers=args.workers,
+        dry_run=args.dry_run,
+    )
+    print_reoptimize_report(reports, dry_run=args.dry_run)
+    print(f"耗时 {time.perf_counter() - start:.1f}s{'（试运行，未写入文件）' if args.dry_run else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())